@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# Limites acumulados da curva ABC (sobre a receita líquida)
+LIMITE_CLASSE_A = 0.80
+LIMITE_CLASSE_B = 0.95
+
+# Engenharia de cardápio (Kasavana & Smith): popular se mix >= 70% da participação média
+FATOR_POPULARIDADE = 0.70
+
+QUADRANTES = {
+    (True, True): 'Estrela',
+    (True, False): 'Burro de Carga',
+    (False, True): 'Quebra-cabeça',
+    (False, False): 'Cão',
+}
+
+
+def calcular_analytics(resultado):
+    """
+    Calcula ABC/Pareto, ranking de margem de contribuição, quadrantes de engenharia
+    de cardápio e consolidação por Categoria sobre a tabela `resultado`.
+
+    Tudo é vetorizado: as classificações são colunas calculadas de uma vez e a
+    consolidação por categoria é um único groupby com agregações nomeadas.
+
+    Returns:
+        dict: {'produtos': DataFrame por produto, 'categorias': DataFrame por categoria,
+               'abc': DataFrame resumo por classe, 'quadrantes': DataFrame resumo por quadrante}
+    """
+
+    colunas = ['Categoria', 'Produto', 'Quantidade', 'Valor', 'Receita_Liquida_Produto', 'Margem_Unitaria']
+    df = resultado[[c for c in colunas if c in resultado.columns]].copy()
+    if 'Categoria' not in df.columns:
+        df['Categoria'] = 'Sem Categoria'
+    df['Categoria'] = df['Categoria'].fillna('Sem Categoria')
+
+    receita_liq = df['Receita_Liquida_Produto'].to_numpy(dtype=float)
+    quantidade = df['Quantidade'].to_numpy(dtype=float)
+
+    # 1. Curva ABC por receita líquida (só contribuições positivas entram no acumulado)
+    ordem = np.argsort(-receita_liq, kind='stable')
+    positiva = np.clip(receita_liq[ordem], 0, None)
+    total_positivo = positiva.sum()
+    acumulado = np.empty_like(receita_liq)
+    acumulado[ordem] = np.cumsum(positiva) / total_positivo if total_positivo > 0 else 1.0
+    # O produto que cruza o limite ainda pertence à classe (usa o acumulado anterior)
+    anterior = acumulado - (np.clip(receita_liq, 0, None) / total_positivo if total_positivo > 0 else 0)
+    df['Percentual_Acumulado'] = acumulado * 100
+    df['Classe_ABC'] = np.select(
+        [anterior < LIMITE_CLASSE_A, anterior < LIMITE_CLASSE_B],
+        ['A', 'B'],
+        default='C'
+    )
+
+    # 2. Ranking de margem de contribuição
+    df['Ranking_Margem'] = pd.Series(receita_liq, index=df.index).rank(ascending=False, method='min').astype(int)
+
+    # 3. Engenharia de cardápio: popularidade (mix de vendas) x margem unitária
+    qtd_total = quantidade.sum()
+    n_produtos = len(df)
+    mix = quantidade / qtd_total if qtd_total > 0 else np.zeros_like(quantidade)
+    corte_popularidade = FATOR_POPULARIDADE / n_produtos if n_produtos > 0 else 0
+    margem_media = receita_liq.sum() / qtd_total if qtd_total > 0 else 0
+
+    popular = mix >= corte_popularidade
+    lucrativo = df['Margem_Unitaria'].to_numpy(dtype=float) >= margem_media
+    df['Mix_Vendas_Percentual'] = mix * 100
+    df['Quadrante'] = np.select(
+        [popular & lucrativo, popular & ~lucrativo, ~popular & lucrativo],
+        [QUADRANTES[(True, True)], QUADRANTES[(True, False)], QUADRANTES[(False, True)]],
+        default=QUADRANTES[(False, False)]
+    )
+
+    # 4. Consolidação por Categoria (um único groupby)
+    df['_A'] = df['Classe_ABC'] == 'A'
+    df['_Estrela'] = df['Quadrante'] == QUADRANTES[(True, True)]
+    df['_Cao'] = df['Quadrante'] == QUADRANTES[(False, False)]
+    categorias = df.groupby('Categoria', sort=False).agg(
+        Produtos=('Produto', 'size'),
+        Quantidade=('Quantidade', 'sum'),
+        Valor=('Valor', 'sum'),
+        Receita_Liquida=('Receita_Liquida_Produto', 'sum'),
+        Produtos_A=('_A', 'sum'),
+        Estrelas=('_Estrela', 'sum'),
+        Caes=('_Cao', 'sum'),
+    )
+    df = df.drop(columns=['_A', '_Estrela', '_Cao'])
+
+    receita_total = categorias['Valor'].sum()
+    categorias['Participacao_Receita'] = categorias['Valor'] / receita_total * 100 if receita_total > 0 else 0
+    categorias['Margem_Percentual'] = (categorias['Receita_Liquida'] / categorias['Valor'].where(categorias['Valor'] > 0) * 100).fillna(0)
+    categorias = categorias.sort_values('Receita_Liquida', ascending=False).reset_index()
+
+    # Resumos pequenos para os painéis
+    abc = (df.groupby('Classe_ABC')
+           .agg(Produtos=('Produto', 'size'), Receita_Liquida=('Receita_Liquida_Produto', 'sum'))
+           .reindex(['A', 'B', 'C'], fill_value=0).reset_index())
+    quadrantes = (df.groupby('Quadrante')
+                  .agg(Produtos=('Produto', 'size'), Receita_Liquida=('Receita_Liquida_Produto', 'sum'))
+                  .reindex(list(QUADRANTES.values()), fill_value=0).reset_index())
+
+    return {
+        'produtos': df.sort_values('Ranking_Margem').reset_index(drop=True),
+        'categorias': categorias,
+        'abc': abc,
+        'quadrantes': quadrantes,
+        'margem_media_unitaria': margem_media,
+        'corte_popularidade_percentual': corte_popularidade * 100,
+    }
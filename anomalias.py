@@ -0,0 +1,246 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from exportador import exportar_arquivo
+from previsao import converter_mes_referencia, ordenar_historico
+
+# Escore-z modificado (Iglewicz & Hoaglin): |z| > 3.5 é considerado atípico
+LIMITE_ESCORE = 3.5
+CONSTANTE_MAD = 0.6745
+
+# Participação de cartão de crédito (e equivalentes) acima disso num item grande é suspeita
+LIMITE_PARTICIPACAO_CREDITO = 0.95
+
+# Meses de histórico usados como referência para o mix de pagamento e para cada produto
+JANELA_HISTORICO = 12
+MINIMO_HISTORICO = 4
+
+# Quantidade e valor de cada produto por mês, gravados junto com o histórico financeiro
+ARQUIVO_HISTORICO_PRODUTOS = 'historico_produtos.csv'
+
+# Itens cujo nome sugere produção/consumo interno (não são venda de verdade)
+PADRAO_ITEM_INTERNO = re.compile(
+    r"produ[çc][ãa]o|interno|consumo|funcion[áa]rio|cortesia|teste|transfer[êe]ncia",
+    re.IGNORECASE
+)
+
+COLUNAS_CREDITO = ['Crédito', 'Cashless', 'Voucher', 'Divisão', 'Outros']
+
+
+def escore_robusto(valores, grupos=None):
+    """
+    Escore-z modificado: 0.6745 * (x - mediana) / MAD, calculado por grupo se `grupos` for dado.
+    Onde o MAD é zero (grupo constante ou pequeno demais) o escore é 0.
+    """
+    valores = pd.Series(valores, dtype=float)
+    if grupos is None:
+        mediana = pd.Series(valores.median(), index=valores.index)
+        desvio = (valores - mediana).abs()
+        mad = pd.Series(desvio.median(), index=valores.index)
+    else:
+        mediana = valores.groupby(grupos, sort=False).transform('median')
+        desvio = (valores - mediana).abs()
+        mad = desvio.groupby(grupos, sort=False).transform('median')
+    return _escore(valores, mediana, mad), mediana
+
+
+def _escore(valores, mediana, mad):
+    return (CONSTANTE_MAD * (valores - mediana) / mad.where(mad > 0)).fillna(0)
+
+
+# --- Histórico por produto ---
+
+def registros_produtos(resultado, mes_referencia):
+    """Quantidade e valor do mês somados por produto (linhas do histórico de produtos)"""
+    por_produto = resultado.groupby('Produto', sort=False)[['Quantidade', 'Valor']].sum().reset_index()
+    por_produto.insert(0, 'Mes_Referencia', mes_referencia)
+    return por_produto
+
+
+def carregar_historico_produtos(arquivo=ARQUIVO_HISTORICO_PRODUTOS):
+    if not os.path.exists(arquivo):
+        return None
+    return pd.read_csv(arquivo, dtype={'Mes_Referencia': str, 'Produto': str})
+
+
+def salvar_historico_produtos(resultado, mes_referencia, arquivo=ARQUIVO_HISTORICO_PRODUTOS):
+    """Insere/substitui o mês no histórico por produto (escrita atômica)"""
+    novo = registros_produtos(resultado, mes_referencia)
+    antigo = carregar_historico_produtos(arquivo)
+    if antigo is not None:
+        novo = pd.concat([antigo[antigo['Mes_Referencia'] != mes_referencia], novo], ignore_index=True)
+    exportar_arquivo(novo, {}, arquivo, formato='csv')
+    return novo
+
+
+def remover_mes_historico_produtos(mes_referencia, arquivo=ARQUIVO_HISTORICO_PRODUTOS):
+    historico = carregar_historico_produtos(arquivo)
+    if historico is not None:
+        exportar_arquivo(historico[historico['Mes_Referencia'] != mes_referencia], {}, arquivo, formato='csv')
+
+
+def referencia_produtos(historico_produtos, mes_referencia=None):
+    """
+    Mediana e MAD do preço médio e do log da quantidade de cada produto nos JANELA_HISTORICO
+    meses anteriores a `mes_referencia`. Só produtos vendidos em pelo menos MINIMO_HISTORICO deles.
+
+    Returns:
+        DataFrame indexado por Produto: Preco, Preco_MAD, Log_Qtd, Log_Qtd_MAD
+    """
+    colunas = ['Preco', 'Preco_MAD', 'Log_Qtd', 'Log_Qtd_MAD']
+    if historico_produtos is None or historico_produtos.empty:
+        return pd.DataFrame(columns=colunas)
+
+    historico = ordenar_historico(historico_produtos)
+    data_atual = converter_mes_referencia(mes_referencia)
+    if pd.notna(data_atual):
+        historico = historico[historico['Data_Ordenacao'] < data_atual]
+    elif mes_referencia is not None:
+        historico = historico[historico['Mes_Referencia'] != mes_referencia]
+    meses = historico['Data_Ordenacao'].drop_duplicates().tail(JANELA_HISTORICO)
+    historico = historico[historico['Data_Ordenacao'].isin(meses) & (historico['Quantidade'] > 0)]
+
+    medidas = pd.DataFrame({'Preco': historico['Valor'] / historico['Quantidade'],
+                            'Log_Qtd': np.log1p(historico['Quantidade'])})
+    produtos = historico['Produto']
+    mediana = medidas.groupby(produtos).median()
+    mad = (medidas - mediana.reindex(produtos).to_numpy()).abs().groupby(produtos).median()
+    referencia = mediana.join(mad, rsuffix='_MAD')[colunas]
+    return referencia[produtos.value_counts().reindex(referencia.index) >= MINIMO_HISTORICO]
+
+
+def _alertas(df, mascara, tipo, observado, referencia, escore, detalhe):
+    if not mascara.any():
+        return None
+    return pd.DataFrame({
+        'Tipo': tipo,
+        'Categoria': df.loc[mascara, 'Categoria'] if 'Categoria' in df.columns else '',
+        'Produto': df.loc[mascara, 'Produto'],
+        'Valor_Observado': pd.Series(observado, index=df.index)[mascara],
+        'Referencia': pd.Series(referencia, index=df.index)[mascara],
+        'Escore': pd.Series(escore, index=df.index)[mascara],
+        'Detalhe': detalhe[mascara] if isinstance(detalhe, pd.Series) else detalhe,
+    })
+
+
+def detectar_anomalias_vendas(resultado, historico_produtos=None, mes_referencia=None):
+    """
+    Detecta itens atípicos nas vendas do mês (tudo vetorizado):
+    - Preço médio (Valor / Quantidade) fora do padrão do produto
+    - Quantidade muito acima do padrão do produto
+    - Itens grandes pagos quase só no crédito (candidatos a pedalada)
+    - Itens com nome de produção/consumo interno que não foram tratados como pedalada
+
+    O padrão do produto é a mediana/MAD dos meses anteriores em `historico_produtos`
+    (ver referencia_produtos); sem histórico suficiente, o item é comparado com a sua
+    Categoria no próprio mês.
+
+    Returns:
+        DataFrame com uma linha por alerta (vazio se nada for encontrado)
+    """
+
+    colunas_alerta = ['Tipo', 'Categoria', 'Produto', 'Valor_Observado', 'Referencia', 'Escore', 'Detalhe']
+    if resultado.empty:
+        return pd.DataFrame(columns=colunas_alerta)
+
+    df = resultado
+    grupos = df['Categoria'].fillna('Sem Categoria') if 'Categoria' in df.columns else None
+    quantidade = df['Quantidade'].astype(float)
+    valor = df['Valor'].astype(float)
+    alertas = []
+
+    # Referência do próprio produto nos meses anteriores (onde houver histórico suficiente)
+    referencia = referencia_produtos(historico_produtos, mes_referencia).reindex(df['Produto'].astype(str))
+    referencia.index = df.index
+    tem_historico = referencia['Preco'].notna()
+    origem = pd.Series(np.where(tem_historico, 'do histórico do produto', 'da categoria'), index=df.index)
+
+    # 1. Preço médio por unidade
+    preco = (valor / quantidade.where(quantidade > 0)).fillna(0)
+    escore_preco, mediana_preco = escore_robusto(preco, grupos)
+    escore_preco = escore_preco.where(~tem_historico, _escore(preco, referencia['Preco'], referencia['Preco_MAD']))
+    mediana_preco = mediana_preco.where(~tem_historico, referencia['Preco'])
+    mascara = (quantidade > 0) & (escore_preco.abs() > LIMITE_ESCORE)
+    alertas.append(_alertas(df, mascara, 'Preço atípico', preco, mediana_preco, escore_preco,
+                            'Preço médio muito diferente da mediana ' + origem))
+
+    # Quantidade/valor inconsistentes (venda sem quantidade ou quantidade negativa)
+    mascara = ((quantidade <= 0) & (valor > 0)) | (quantidade < 0)
+    alertas.append(_alertas(df, mascara, 'Quantidade inválida', quantidade, 0, 0,
+                            'Quantidade zero/negativa com valor de venda'))
+
+    # 2. Quantidade (escala log, só o lado alto interessa)
+    log_qtd = np.log1p(quantidade.clip(lower=0))
+    escore_qtd, mediana_log = escore_robusto(log_qtd, grupos)
+    escore_qtd = escore_qtd.where(~tem_historico, _escore(log_qtd, referencia['Log_Qtd'], referencia['Log_Qtd_MAD']))
+    mediana_log = mediana_log.where(~tem_historico, referencia['Log_Qtd'])
+    mascara = escore_qtd > LIMITE_ESCORE
+    alertas.append(_alertas(df, mascara, 'Quantidade atípica', quantidade, np.expm1(mediana_log), escore_qtd,
+                            'Quantidade muito acima da mediana ' + origem))
+
+    # 3. Item grande pago quase todo no crédito
+    colunas_credito = [c for c in COLUNAS_CREDITO if c in df.columns]
+    credito = df[colunas_credito].sum(axis=1) if colunas_credito else pd.Series(0.0, index=df.index)
+    participacao = (credito / valor.where(valor > 0)).fillna(0)
+    escore_valor, mediana_valor = escore_robusto(valor)
+    mascara = (participacao >= LIMITE_PARTICIPACAO_CREDITO) & (escore_valor > LIMITE_ESCORE)
+    alertas.append(_alertas(df, mascara, 'Crédito concentrado', valor, mediana_valor, escore_valor,
+                            'Valor alto pago quase só no crédito (possível pedalada)'))
+
+    # 4. Nome de item interno
+    mascara = df['Produto'].astype(str).str.contains(PADRAO_ITEM_INTERNO, na=False)
+    alertas.append(_alertas(df, mascara, 'Item interno', valor, 0, 0,
+                            'Nome sugere produção/consumo interno; confira se deveria ser pedalada'))
+
+    alertas = [a for a in alertas if a is not None]
+    if not alertas:
+        return pd.DataFrame(columns=colunas_alerta)
+    return pd.concat(alertas, ignore_index=True)[colunas_alerta]
+
+
+def participacao_credito(resumo):
+    """
+    Fração da receita que entrou por crédito (bruto, antes de descontar pedaladas manuais).
+    Numerador e denominador na mesma base: os itens que ficaram na análise. Os itens que
+    as regras já retiraram (pedalada automática e demais não-receita) ficam fora dos dois.
+    """
+    receita = (resumo.get('receita_bruta_sistema', 0) - resumo.get('valor_pedalada_auto', 0)
+               - resumo.get('valor_excluido_auto', 0))
+    return resumo.get('total_credito_bruto', 0) / receita if receita > 0 else 0.0
+
+
+def detectar_anomalia_mix_pagamento(resumo, df_hist, mes_referencia=None):
+    """
+    Compara a participação do crédito no mês com os últimos meses do histórico
+    (mediana/MAD). Retorna um dict com o alerta, ou None se estiver dentro do padrão
+    ou não houver histórico suficiente.
+    """
+    if df_hist is None or 'Participacao_Credito' not in df_hist.columns:
+        return None
+
+    historico = ordenar_historico(df_hist)
+    if mes_referencia is not None:
+        historico = historico[historico['Mes_Referencia'] != mes_referencia]
+    serie = historico['Participacao_Credito'].dropna().tail(JANELA_HISTORICO).to_numpy(dtype=float)
+    if len(serie) < MINIMO_HISTORICO:
+        return None
+
+    atual = participacao_credito(resumo)
+    mediana = np.median(serie)
+    mad = np.median(np.abs(serie - mediana))
+    if mad == 0:
+        return None
+    escore = CONSTANTE_MAD * (atual - mediana) / mad
+    if abs(escore) <= LIMITE_ESCORE:
+        return None
+
+    return {
+        'Tipo': 'Mix de pagamento',
+        'Valor_Observado': atual * 100,
+        'Referencia': mediana * 100,
+        'Escore': escore,
+        'Detalhe': f"Crédito em {atual * 100:.1f}% da receita (mediana dos últimos {len(serie)} meses: {mediana * 100:.1f}%)",
+    }
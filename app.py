@@ -9,6 +9,18 @@ import plotly.graph_objects as go
 
 # Importação da classe de cálculo
 from calculadora_com_pedaladas import CalculadoraMargemLucroComPedalada
+from resultado_dashboard import ResultadoDashboard, reduzir_serie
+from exportador import EXPORTADORES, exportar_bytes, formatos_disponiveis
+from previsao import MotorPrevisao, resumo_mes_anterior
+from anomalias import (ARQUIVO_HISTORICO_PRODUTOS, carregar_historico_produtos, detectar_anomalia_mix_pagamento,
+                       remover_mes_historico_produtos, salvar_historico_produtos)
+from regras_pedalada import COLUNAS_REGRAS, TRATAMENTOS, ClassificadorNaoReceita
+from conciliacao import conciliar, ler_extrato, taxas_conciliadas
+from servico_calculo import processar_remoto
+from snapshots_custos import RepositorioSnapshots, ler_historico, recalcular_historico, registro_historico, salvar_no_historico
+
+# Modo multiusuário: com a URL definida o cálculo roda no servico_calculo.py (pool de workers + cache compartilhado)
+URL_SERVICO_CALCULO = os.environ.get("CALCULADORA_SERVICO_URL")
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -165,6 +177,15 @@ def carregar_dados_csv(arquivo, colunas_padrao):
             st.session_state[arquivo] = pd.DataFrame(columns=colunas_padrao)
     return st.session_state[arquivo]
 
+@st.cache_resource
+def obter_repositorio_snapshots():
+    return RepositorioSnapshots()
+
+@st.cache_resource
+def obter_motor_previsao():
+    """Um motor por processo: modelos e projeções ficam em cache entre sessões e reruns"""
+    return MotorPrevisao(horizonte=3)
+
 def formatar_moeda(valor):
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
@@ -213,6 +234,8 @@ with st.sidebar:
     arquivo_vendas = st.file_uploader("Arquivo do Sistema", type=["xlsx", "xls", "csv"], help="Arraste o arquivo de vendas aqui.")
     
     valor_pedaladas = st.number_input("Valor Pedaladas (R$)", min_value=0.0, value=0.0, step=100.0, help="Valor total descontado por antecipações ou taxas extras.")
+    if URL_SERVICO_CALCULO:
+        st.caption(f"⚡ Cálculo no serviço compartilhado: {URL_SERVICO_CALCULO}")
 
 # --- LÓGICA PRINCIPAL ---
 
@@ -227,24 +250,43 @@ if menu == "📊 Dashboard Mensal":
         if arquivo_vendas:
             with st.spinner('Processando inteligência de dados...'):
                 try:
-                    if arquivo_vendas.name.endswith(".xlsx"):
-                        suffix = ".xlsx"
-                    elif arquivo_vendas.name.endswith(".xls"):
-                        suffix = ".xls"
+                    # Congela os custos usados neste cálculo (não grava nada se já existir snapshot igual).
+                    # O serviço compartilhado também calcula com este snapshot, então o histórico aponta o que foi usado.
+                    repositorio = obter_repositorio_snapshots()
+                    snapshot_id = repositorio.criar_snapshot(descricao="Processamento do Dashboard")
+                    taxas_sessao = st.session_state.get('taxas_conciliadas')
+
+                    if URL_SERVICO_CALCULO:
+                        resumo, df_resultado = processar_remoto(
+                            URL_SERVICO_CALCULO, arquivo_vendas.getvalue(), arquivo_vendas.name,
+                            mes_ref_formatado, valor_pedaladas, taxas_sessao, snapshot_id
+                        )
                     else:
-                        suffix = ".csv"
-                        
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                        tmp.write(arquivo_vendas.getvalue())
-                        path_vendas_temp = tmp.name
-                    
-                    calc = CalculadoraMargemLucroComPedalada("Variaveis.csv", "Fixos.csv")
-                    resumo, df_resultado = calc.processar_relatorio_mensal(
-                        path_vendas_temp, mes_ref_formatado, valor_pedaladas, salvar_resultado=False
-                    )
-                    
-                    st.session_state['ultimo_resultado'] = {"resumo": resumo, "df": df_resultado, "mes": mes_ref_formatado}
-                    os.remove(path_vendas_temp)
+                        if arquivo_vendas.name.endswith(".xlsx"):
+                            suffix = ".xlsx"
+                        elif arquivo_vendas.name.endswith(".xls"):
+                            suffix = ".xls"
+                        else:
+                            suffix = ".csv"
+
+                        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+                            tmp.write(arquivo_vendas.getvalue())
+                            path_vendas_temp = tmp.name
+
+                        calc = repositorio.calculadora(snapshot_id, taxas_pagamento=taxas_sessao)
+                        resumo, df_resultado = calc.processar_relatorio_mensal(
+                            path_vendas_temp, mes_ref_formatado, valor_pedaladas, salvar_resultado=False
+                        )
+                        os.remove(path_vendas_temp)
+
+                    # Entrada do cálculo, para o histórico saber de onde veio cada mês
+                    extensao = os.path.splitext(arquivo_vendas.name)[1] or ".csv"
+                    resumo['snapshot_custos'] = snapshot_id
+                    resumo['objeto_vendas'] = repositorio.guardar_objeto(arquivo_vendas.getvalue(), extensao)
+                    resumo['pedaladas_informadas'] = valor_pedaladas
+                    resumo['taxas_conciliadas'] = taxas_sessao
+
+                    st.session_state['ultimo_resultado'] = ResultadoDashboard(resumo, df_resultado, mes_ref_formatado)
                     st.toast("Dados processados com sucesso!", icon="✅")
                 except Exception as e:
                     st.error(f"Erro crítico: {e}")
@@ -254,20 +296,42 @@ if menu == "📊 Dashboard Mensal":
     # Exibição dos Resultados
     if st.session_state['ultimo_resultado']:
         dados = st.session_state['ultimo_resultado']
-        resumo = dados['resumo']
-        df_resultado = dados['df']
+        resumo = dados.resumo
         
         # 1. KPIs Principais (Cards Premium)
         st.markdown("### 🎯 Performance Financeira")
 
-        # Alerta de Pedalada Automática
-        valor_auto = resumo.get('valor_pedalada_auto', 0)
-        if valor_auto > 0:
-            st.warning(f"⚠️ Atenção: Foi detectado 'Produção Cozinha Industrial' no valor de R$ {valor_auto:,.2f}. Este valor foi automaticamente convertido para Pedalada e removido da análise de produtos.")
+        # Alerta de itens classificados automaticamente (Regras_Pedalada.csv)
+        tratamentos_legenda = {'pedalada': 'convertido para Pedalada', 'nao_receita': 'tratado como não-receita (mantém taxas e insumos)',
+                               'ignorar': 'ignorado (sem taxas nem custo)'}
+        for regra, info in resumo.get('regras_nao_receita', {}).items():
+            if info['valor'] > 0:
+                st.warning(f"⚠️ Atenção: Foi detectado '{regra}' ({info['itens']} item(ns)) no valor de R$ {info['valor']:,.2f}. "
+                           f"Este valor foi automaticamente {tratamentos_legenda.get(info['tratamento'], info['tratamento'])} e removido da análise de produtos.")
+
+        # Comparativo com o mês anterior salvo no histórico
+        comparativo = None
+        alerta_mix = None
+        if os.path.exists("historico_financeiro.csv"):
+            df_hist_atual = ler_historico("historico_financeiro.csv")
+            anterior = resumo_mes_anterior(df_hist_atual, dados.mes)
+            comparativo = CalculadoraMargemLucroComPedalada().comparar_mes_anterior(resumo, anterior)
+            alerta_mix = detectar_anomalia_mix_pagamento(resumo, df_hist_atual, dados.mes)
+        comparativo = comparativo or {}
+
+        # Alertas de anomalias (itens atípicos e mix de pagamento fora do padrão)
+        anomalias = dados.anomalias(carregar_historico_produtos())
+        if alerta_mix:
+            anomalias = pd.concat([pd.DataFrame([alerta_mix]), anomalias], ignore_index=True)
+        if not anomalias.empty:
+            with st.expander(f"🚨 {len(anomalias)} anomalia(s) detectada(s) — revise antes de fechar o mês"):
+                if alerta_mix:
+                    st.error(alerta_mix['Detalhe'])
+                st.dataframe(anomalias, use_container_width=True, hide_index=True)
 
         c1, c2, c3, c4 = st.columns(4)
-        with c1: kpi_card("Faturamento Real", resumo['receita_bruta_real'])
-        with c2: kpi_card("Lucro Líquido", resumo['lucro_liquido_estimado'])
+        with c1: kpi_card("Faturamento Real", resumo['receita_bruta_real'], delta=comparativo.get('delta_receita_bruta_real'))
+        with c2: kpi_card("Lucro Líquido", resumo['lucro_liquido_estimado'], delta=comparativo.get('delta_lucro_liquido'))
         with c3: kpi_card("Margem Líquida", resumo['margem_liquida_percentual'], prefix="", suffix="%")
         with c4: kpi_card("Break-even Point", resumo.get('kpi_break_even', 0))
 
@@ -278,53 +342,169 @@ if menu == "📊 Dashboard Mensal":
         
         with col_g1:
             st.subheader("📊 Composição de Custos vs Lucro")
-            # Dados para o Donut Chart
-            labels = ['Custos Variáveis', 'Custos Fixos', 'Taxas', 'Lucro Líquido']
-            values = [
-                resumo['custos_variaveis_totais'],
-                resumo['custos_fixos_total'],
-                resumo['taxa_total_geral'],
-                resumo['lucro_liquido_estimado']
-            ]
-            colors = ['#e74c3c', '#f39c12', '#95a5a6', '#2ecc71']
-            
-            fig_donut = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.4, marker_colors=colors)])
-            fig_donut.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
-            st.plotly_chart(fig_donut, use_container_width=True)
+            # Figuras montadas uma vez por processamento e reaproveitadas nos reruns
+            def montar_donut():
+                labels, values = dados.dados_donut
+                colors = ['#e74c3c', '#f39c12', '#95a5a6', '#2ecc71']
+                fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.4, marker_colors=colors)])
+                fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
+                return fig
+
+            st.plotly_chart(dados.memo('fig_donut', montar_donut), use_container_width=True)
             
         with col_g2:
             st.subheader("🏆 Top 5 Produtos (Receita)")
-            top_prod = df_resultado.nlargest(5, 'Receita_Liquida_Produto')
-            fig_bar = px.bar(top_prod, x='Receita_Liquida_Produto', y='Produto', orientation='h', text_auto='.2s')
-            fig_bar.update_layout(yaxis={'categoryorder':'total ascending'}, paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
-            fig_bar.update_traces(marker_color='#58a6ff')
-            st.plotly_chart(fig_bar, use_container_width=True)
 
-        # 3. Tabela Detalhada
+            def montar_top():
+                fig = px.bar(dados.top_produtos(5), x='Receita_Liquida_Produto', y='Produto', orientation='h', text_auto='.2s')
+                fig.update_layout(yaxis={'categoryorder':'total ascending'}, paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
+                fig.update_traces(marker_color='#58a6ff')
+                return fig
+
+            st.plotly_chart(dados.memo('fig_top', montar_top), use_container_width=True)
+
+        # Receita por Categoria
+        st.subheader("🗂️ Receita Líquida por Categoria")
+
+        def montar_categorias():
+            fig = px.bar(dados.resumo_categorias, x='Categoria', y='Receita_Liquida', text_auto='.2s')
+            fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
+            fig.update_traces(marker_color='#58a6ff')
+            return fig
+
+        st.plotly_chart(dados.memo('fig_categorias', montar_categorias), use_container_width=True)
+
+        # Análise de Produtos (ABC / Engenharia de Cardápio)
+        st.subheader("🧭 Análise de Produtos")
+        analytics = dados.analytics
+        tab_abc, tab_menu, tab_cat = st.tabs(["📐 Curva ABC", "🍽️ Engenharia de Cardápio", "🗂️ Categorias"])
+
+        with tab_abc:
+            c_abc1, c_abc2 = st.columns([1, 2])
+            with c_abc1:
+                st.dataframe(analytics['abc'], use_container_width=True, hide_index=True)
+            with c_abc2:
+                def montar_pareto():
+                    pareto = analytics['produtos'].nlargest(30, 'Receita_Liquida_Produto')
+                    fig = go.Figure()
+                    fig.add_trace(go.Bar(x=pareto['Produto'], y=pareto['Receita_Liquida_Produto'], name='Receita Líquida', marker_color='#58a6ff'))
+                    fig.add_trace(go.Scatter(x=pareto['Produto'], y=pareto['Percentual_Acumulado'], name='% Acumulado', yaxis='y2', line=dict(color='#f39c12')))
+                    fig.update_layout(yaxis2=dict(overlaying='y', side='right', range=[0, 100]),
+                                      paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
+                    return fig
+
+                st.plotly_chart(dados.memo('fig_pareto', montar_pareto), use_container_width=True)
+
+        with tab_menu:
+            def montar_quadrantes():
+                fig = px.scatter(analytics['produtos'], x='Mix_Vendas_Percentual', y='Margem_Unitaria', color='Quadrante',
+                                 hover_name='Produto', color_discrete_map={'Estrela': '#2ecc71', 'Burro de Carga': '#f39c12',
+                                                                           'Quebra-cabeça': '#3498db', 'Cão': '#e74c3c'})
+                fig.add_vline(x=analytics['corte_popularidade_percentual'], line_dash="dash", line_color="#8b949e")
+                fig.add_hline(y=analytics['margem_media_unitaria'], line_dash="dash", line_color="#8b949e")
+                fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
+                return fig
+
+            st.plotly_chart(dados.memo('fig_quadrantes', montar_quadrantes), use_container_width=True)
+            st.dataframe(analytics['quadrantes'], use_container_width=True, hide_index=True)
+
+        with tab_cat:
+            st.dataframe(analytics['categorias'], use_container_width=True, hide_index=True)
+
+        # 3. Tabela Detalhada (paginada no servidor: só a página atual vai para o navegador)
         with st.expander("📋 Ver Detalhamento Completo dos Dados"):
-            st.dataframe(df_resultado, use_container_width=True)
+            c_ord, c_dir, c_tam, c_pag = st.columns([2, 1, 1, 1])
+            with c_ord:
+                ordenar_por = st.selectbox("Ordenar por", list(dados.detalhe.columns),
+                                           index=list(dados.detalhe.columns).index('Receita_Liquida_Produto') if 'Receita_Liquida_Produto' in dados.detalhe.columns else 0)
+            with c_dir:
+                ascendente = st.radio("Ordem", ["Desc", "Asc"], horizontal=True) == "Asc"
+            with c_tam:
+                tamanho_pagina = st.selectbox("Linhas", [25, 50, 100], index=1)
+            with c_pag:
+                pagina = st.number_input("Página", min_value=1, max_value=dados.total_paginas(tamanho_pagina), value=1)
+
+            st.dataframe(dados.pagina_detalhe(pagina, tamanho_pagina, ordenar_por, ascendente),
+                         use_container_width=True, hide_index=True)
+            st.caption(f"{len(dados.detalhe)} produtos · página {pagina} de {dados.total_paginas(tamanho_pagina)}")
             
+        # Exportação (gerada em memória só quando pedida)
+        with st.expander("📤 Exportar Resultado"):
+            c_fmt, c_btn = st.columns([2, 1])
+            with c_fmt:
+                formato_export = st.selectbox("Formato", formatos_disponiveis(), format_func=str.upper)
+            with c_btn:
+                st.write("")
+                if st.button("⚙️ Gerar arquivo", use_container_width=True):
+                    dados.memo(('export', formato_export), lambda: exportar_bytes(dados.df, resumo, formato_export))
+
+            arquivo_export = dados.obter_memo(('export', formato_export))
+            if arquivo_export is not None:
+                nome_base = f"margem_lucro_{dados.mes}".replace("/", "_")
+                st.download_button(
+                    f"⬇️ Baixar {formato_export.upper()}",
+                    data=arquivo_export,
+                    file_name=f"{nome_base}.{EXPORTADORES[formato_export].extensao}",
+                    mime=EXPORTADORES[formato_export].mime,
+                    use_container_width=True
+                )
+
+        # Conciliação com o extrato da adquirente/banco
+        with st.expander("🏦 Conciliação com Extrato"):
+            arquivo_extrato = st.file_uploader("Extrato de liquidação (CSV ou OFX)", type=["csv", "ofx", "txt"], key="extrato")
+            if arquivo_extrato:
+                try:
+                    conciliacao = dados.memo(
+                        ('conciliacao', arquivo_extrato.name, arquivo_extrato.size),
+                        lambda: conciliar(resumo, ler_extrato(arquivo_extrato.getvalue()), dados.mes)
+                    )
+                except ValueError as e:
+                    st.error(f"Erro ao ler o extrato: {e}")
+                    conciliacao = None
+
+                if conciliacao is not None:
+                    movimento = conciliacao[(conciliacao['Bruto_Estimado'] > 0) | (conciliacao['Bruto_Extrato'] > 0)]
+                    st.dataframe(
+                        movimento, use_container_width=True, hide_index=True,
+                        column_config={
+                            "Metodo": "Forma de Pagamento",
+                            "Bruto_Estimado": st.column_config.NumberColumn("Bruto (Sistema)", format="R$ %.2f"),
+                            "Bruto_Extrato": st.column_config.NumberColumn("Bruto (Extrato)", format="R$ %.2f"),
+                            "Taxa_Estimada": st.column_config.NumberColumn("Taxa Estimada", format="R$ %.2f"),
+                            "Taxa_Real": st.column_config.NumberColumn("Taxa Real", format="R$ %.2f"),
+                            "Liquido_Extrato": st.column_config.NumberColumn("Líquido Recebido", format="R$ %.2f"),
+                            "Diferenca_Bruto": st.column_config.NumberColumn("Dif. Bruto", format="R$ %.2f"),
+                            "Diferenca_Taxa": st.column_config.NumberColumn("Dif. Taxa", format="R$ %.2f"),
+                            "Taxa_Estimada_Percentual": st.column_config.NumberColumn("Taxa Est. %", format="%.2f%%"),
+                            "Taxa_Real_Percentual": st.column_config.NumberColumn("Taxa Real %", format="%.2f%%"),
+                        }
+                    )
+                    sem_taxa = movimento.loc[movimento['Taxa_Real'].isna() & (movimento['Bruto_Extrato'] > 0), 'Metodo']
+                    if not sem_taxa.empty:
+                        st.info(f"Extrato sem taxa para {', '.join(sem_taxa)} (só valores líquidos): a taxa configurada é mantida.")
+                    diferenca = movimento['Diferenca_Taxa'].sum()
+                    if abs(diferenca) >= 0.01:
+                        st.warning(f"Taxas reais diferem das estimadas em {formatar_moeda(diferenca)} no mês.")
+
+                    if st.button("🔁 Usar taxas reais nos próximos processamentos", use_container_width=True):
+                        st.session_state['taxas_conciliadas'] = taxas_conciliadas(conciliacao, resumo['taxas_pagamento'])
+                        st.info("Taxas atualizadas. Clique em 'Processar Dados' para recalcular o mês.")
+
+            if st.session_state.get('taxas_conciliadas'):
+                taxas_txt = ", ".join(f"{k} {v * 100:.2f}%" for k, v in st.session_state['taxas_conciliadas'].items())
+                st.caption(f"Taxas conciliadas em uso: {taxas_txt}")
+                if st.button("↩️ Voltar às taxas padrão"):
+                    st.session_state['taxas_conciliadas'] = None
+                    st.rerun()
+
         # 4. Salvar Histórico
         if st.button("💾 Salvar no Histórico", use_container_width=True):
-            arquivo_hist = "historico_financeiro.csv"
-            novo_registro = {
-                "Mes_Referencia": dados['mes'],
-                "Receita_Real": resumo['receita_bruta_real'],
-                "Lucro_Liquido": resumo['lucro_liquido_estimado'],
-                "Margem_Percentual": resumo['margem_liquida_percentual'],
-                "Custos_Fixos": resumo['custos_fixos_total'],
-                "Ticket_Medio": resumo.get('ticket_medio_real', 0)
-            }
-            df_novo = pd.DataFrame([novo_registro])
-            
-            if not os.path.exists(arquivo_hist):
-                df_novo.to_csv(arquivo_hist, index=False)
-            else:
-                df_antigo = pd.read_csv(arquivo_hist)
-                # Remove duplicatas do mesmo mês
-                df_antigo = df_antigo[df_antigo['Mes_Referencia'] != dados['mes']]
-                df_final = pd.concat([df_antigo, df_novo], ignore_index=True)
-                df_final.to_csv(arquivo_hist, index=False)
+            novo_registro = registro_historico(
+                resumo, dados.mes, resumo.get('snapshot_custos'), resumo.get('objeto_vendas'),
+                resumo.get('pedaladas_informadas', 0), resumo.get('taxas_conciliadas')
+            )
+            salvar_no_historico([novo_registro], "historico_financeiro.csv")
+            salvar_historico_produtos(dados.df, dados.mes)
             
             st.success("Histórico atualizado com sucesso!")
             time.sleep(1)
@@ -334,7 +514,7 @@ elif menu == "📈 Analytics & Evolução":
     st.title("📈 Inteligência Histórica")
     
     if os.path.exists("historico_financeiro.csv"):
-        df_hist = pd.read_csv("historico_financeiro.csv")
+        df_hist = ler_historico("historico_financeiro.csv")
         
         if not df_hist.empty:
             # Tratamento de Data
@@ -365,9 +545,10 @@ elif menu == "📈 Analytics & Evolução":
             
             # Gráfico de Evolução (Linha Dupla)
             st.subheader("Evolução: Receita vs Lucro")
+            df_evol = reduzir_serie(df_hist, max_pontos=60)
             fig_evol = go.Figure()
-            fig_evol.add_trace(go.Scatter(x=df_hist['Mes_Referencia'], y=df_hist['Receita_Real'], mode='lines+markers', name='Receita', line=dict(color='#3498db', width=3)))
-            fig_evol.add_trace(go.Scatter(x=df_hist['Mes_Referencia'], y=df_hist['Lucro_Liquido'], mode='lines+markers', name='Lucro', line=dict(color='#2ecc71', width=3)))
+            fig_evol.add_trace(go.Scatter(x=df_evol['Mes_Referencia'], y=df_evol['Receita_Real'], mode='lines+markers', name='Receita', line=dict(color='#3498db', width=3)))
+            fig_evol.add_trace(go.Scatter(x=df_evol['Mes_Referencia'], y=df_evol['Lucro_Liquido'], mode='lines+markers', name='Lucro', line=dict(color='#2ecc71', width=3)))
             fig_evol.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white", hovermode="x unified")
             st.plotly_chart(fig_evol, use_container_width=True)
             
@@ -381,7 +562,63 @@ elif menu == "📈 Analytics & Evolução":
             else:
                 st.info("Precisa de pelo menos 2 meses de histórico para calcular variação.")
 
+            # Projeção dos próximos meses
+            st.subheader("🔮 Projeção: Receita, Lucro e Break-even")
+            colunas_previsao = ['Mes_Referencia', 'Receita_Real', 'Lucro_Liquido', 'Margem_Percentual', 'Custos_Fixos', 'Ticket_Medio', 'Margem_Bruta']
+            projecao = obter_motor_previsao().projetar(df_hist.reindex(columns=colunas_previsao))
+            if not projecao.empty:
+                fig_prev = go.Figure()
+                fig_prev.add_trace(go.Scatter(x=df_evol['Mes_Referencia'], y=df_evol['Receita_Real'], mode='lines+markers', name='Receita', line=dict(color='#3498db', width=3)))
+                fig_prev.add_trace(go.Scatter(x=projecao['Mes_Referencia'], y=projecao['Receita_Max'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+                fig_prev.add_trace(go.Scatter(x=projecao['Mes_Referencia'], y=projecao['Receita_Min'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(52, 152, 219, 0.2)', name='Intervalo 95%'))
+                fig_prev.add_trace(go.Scatter(x=projecao['Mes_Referencia'], y=projecao['Receita_Prevista'], mode='lines+markers', name='Receita Prevista', line=dict(color='#3498db', dash='dash')))
+                fig_prev.add_trace(go.Scatter(x=projecao['Mes_Referencia'], y=projecao['Lucro_Previsto'], mode='lines+markers', name='Lucro Previsto', line=dict(color='#2ecc71', dash='dash')))
+                fig_prev.add_trace(go.Scatter(x=projecao['Mes_Referencia'], y=projecao['Break_Even'], mode='lines', name='Break-even', line=dict(color='#f39c12', dash='dot')))
+                fig_prev.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white", hovermode="x unified")
+                st.plotly_chart(fig_prev, use_container_width=True)
+
+                tabela_prev = projecao[['Mes_Referencia', 'Receita_Prevista', 'Receita_Min', 'Receita_Max', 'Lucro_Previsto', 'Break_Even', 'Data_Break_Even', 'Modelo_Receita']].copy()
+                tabela_prev['Data_Break_Even'] = tabela_prev['Data_Break_Even'].dt.strftime("%d/%m/%Y").fillna("Não atingido")
+                st.dataframe(tabela_prev, use_container_width=True, hide_index=True)
+            else:
+                st.info("Precisa de pelo menos 2 meses de histórico para projetar.")
+
             # --- GESTÃO DO HISTÓRICO ---
+            st.markdown("---")
+            st.subheader("🗂️ Recalcular com Snapshots de Custos")
+            st.caption("Cada mês salvo guarda o snapshot de custos e o relatório de vendas usados. "
+                       "Meses cuja entrada não mudou são pulados.")
+            repositorio = obter_repositorio_snapshots()
+            snapshots = repositorio.listar()
+            opcoes_snapshot = [None] + snapshots['Snapshot'].tolist()[::-1]
+            descricoes = dict(zip(snapshots['Snapshot'], snapshots['Criado_Em'] + " · " + snapshots['Descricao']))
+            c_snap, c_meses = st.columns(2)
+            with c_snap:
+                snapshot_alvo = st.selectbox(
+                    "Custos a aplicar", opcoes_snapshot,
+                    format_func=lambda s: "Os da época de cada mês" if s is None else f"{s} ({descricoes.get(s, '')})"
+                )
+            with c_meses:
+                meses_recalculo = st.multiselect("Meses (vazio = todos)", df_hist['Mes_Referencia'].tolist())
+            if st.button("🔁 Recalcular Histórico"):
+                try:
+                    with st.spinner("Recalculando meses alterados..."):
+                        relatorio = recalcular_historico(repositorio, snapshot_alvo, meses_recalculo or None,
+                                                         "historico_financeiro.csv")
+                except Exception as e:
+                    st.error(f"Erro ao recalcular o histórico: {e}")
+                else:
+                    st.success(f"{len(relatorio['recalculados'])} mês(es) recalculado(s), "
+                               f"{len(relatorio['pulados'])} sem mudança.")
+                    if relatorio['sem_vendas']:
+                        st.warning(f"Sem relatório de vendas guardado (salvos antes dos snapshots): {', '.join(relatorio['sem_vendas'])}")
+                    for mes, mensagem in relatorio['erros'].items():
+                        st.error(f"{mes}: não recalculado ({mensagem})")
+                    # Com erros, fica na tela para o gestor ler; os meses recalculados já foram salvos
+                    if relatorio['recalculados'] and not relatorio['erros']:
+                        time.sleep(1)
+                        st.rerun()
+
             st.markdown("---")
             st.subheader("🗑️ Gerenciar Histórico")
             
@@ -394,6 +631,7 @@ elif menu == "📈 Analytics & Evolução":
                     if st.button(f"🗑️ Excluir {mes_para_excluir}"):
                         df_hist = df_hist[df_hist['Mes_Referencia'] != mes_para_excluir]
                         df_hist.to_csv("historico_financeiro.csv", index=False)
+                        remover_mes_historico_produtos(mes_para_excluir)
                         st.success(f"Registro de {mes_para_excluir} removido!")
                         time.sleep(1)
                         st.rerun()
@@ -403,6 +641,8 @@ elif menu == "📈 Analytics & Evolução":
                     if st.button("🔥 Apagar TODO o Histórico", type="primary"):
                         if os.path.exists("historico_financeiro.csv"):
                             os.remove("historico_financeiro.csv")
+                            if os.path.exists(ARQUIVO_HISTORICO_PRODUTOS):
+                                os.remove(ARQUIVO_HISTORICO_PRODUTOS)
                             st.warning("Todo o histórico foi apagado.")
                             time.sleep(1)
                             st.rerun()
@@ -415,7 +655,7 @@ elif menu == "📈 Analytics & Evolução":
 elif menu == "⚙️ Configurações":
     st.title("⚙️ Gestão de Custos")
     
-    tab1, tab2 = st.tabs(["🏢 Custos Fixos", "🍔 Ficha Técnica (Insumos)"])
+    tab1, tab2, tab3 = st.tabs(["🏢 Custos Fixos", "🍔 Ficha Técnica (Insumos)", "🧾 Regras de Pedalada"])
     
     with tab1:
         st.subheader("Custos Fixos Mensais")
@@ -425,7 +665,8 @@ elif menu == "⚙️ Configurações":
         if st.button("💾 Salvar Custos Fixos"):
             df_fixos_editado.to_csv("Fixos.csv", index=False)
             st.session_state["Fixos.csv"] = df_fixos_editado
-            st.success("Custos fixos salvos!")
+            snapshot_id = obter_repositorio_snapshots().criar_snapshot(descricao="Custos Fixos editados")
+            st.success(f"Custos fixos salvos! Snapshot de custos: {snapshot_id}")
 
     with tab2:
         st.subheader("Custos Variáveis (Produtos)")
@@ -452,4 +693,27 @@ elif menu == "⚙️ Configurações":
                 st.session_state["Variaveis.csv"] = df_variaveis_editado
                 
             st.session_state["Variaveis.csv"].to_csv("Variaveis.csv", index=False)
-            st.success("Ficha técnica salva!")
+            snapshot_id = obter_repositorio_snapshots().criar_snapshot(descricao="Ficha Técnica editada")
+            st.success(f"Ficha técnica salva! Snapshot de custos: {snapshot_id}")
+
+    with tab3:
+        st.subheader("Itens que Não São Receita")
+        st.caption("Produtos cujo nome contém o Padrão são retirados da análise. Tratamento: "
+                   "**pedalada** (sai da receita e do crédito, taxas mantidas), "
+                   "**nao_receita** (sai da receita, taxas e insumos mantidos) ou "
+                   "**ignorar** (sai da receita sem taxas nem custo). Valor mínimo/máximo são opcionais.")
+        df_regras = carregar_dados_csv("Regras_Pedalada.csv", COLUNAS_REGRAS)
+        df_regras_editado = st.data_editor(
+            df_regras, num_rows="dynamic", use_container_width=True, height=400,
+            column_config={"Tratamento": st.column_config.SelectboxColumn("Tratamento", options=list(TRATAMENTOS), required=True)}
+        )
+
+        if st.button("💾 Salvar Regras"):
+            try:
+                ClassificadorNaoReceita(df_regras_editado)  # valida antes de gravar
+                df_regras_editado.to_csv("Regras_Pedalada.csv", index=False)
+                st.session_state["Regras_Pedalada.csv"] = df_regras_editado
+                snapshot_id = obter_repositorio_snapshots().criar_snapshot(descricao="Regras de Pedalada editadas")
+                st.success(f"Regras salvas! Snapshot de custos: {snapshot_id}")
+            except ValueError as e:
+                st.error(f"Regras inválidas: {e}")
@@ -3,14 +3,43 @@ import numpy as np
 from datetime import datetime
 import os
 
+from exportador import exportar_arquivo
+from regras_pedalada import carregar_classificador
+from layout_vendas import COLUNAS_NUMERICAS, ler_relatorio_vendas
+
+# Taxas estimadas da maquininha por forma de pagamento (Dinheiro = 0%)
+# Cashless, Voucher, Divisão, Outros = assumir como crédito (3%)
+TAXAS_PAGAMENTO_PADRAO = {
+    'Débito': 0.02,
+    'Crédito': 0.03,
+    'Cashless': 0.03,
+    'Voucher': 0.03,
+    'Divisão': 0.03,
+    'Outros': 0.03,
+}
+
+
+def ponto_equilibrio(custos_fixos, margem_bruta, receita):
+    """
+    Break-even: receita que cobre os custos fixos = custos fixos / margem de contribuição (%),
+    com margem de contribuição = margem bruta (receita - insumos) / receita. 0 se a margem não for positiva.
+    """
+    margem_contrib = (margem_bruta / receita) if receita > 0 else 0
+    return custos_fixos / margem_contrib if margem_contrib > 0 else 0
+
+
 class CalculadoraMargemLucroComPedalada:
     """
     Sistema de margem de lucro com tratamento de 'pedaladas' (falsas vendas no crédito)
     """
 
-    def __init__(self, arquivo_custos_variaveis="Variaveis_completo.csv", arquivo_custos_fixos="Fixos.csv"):
+    def __init__(self, arquivo_custos_variaveis="Variaveis_completo.csv", arquivo_custos_fixos="Fixos.csv",
+                 arquivo_regras_pedalada="Regras_Pedalada.csv", taxas_pagamento=None):
         self.arquivo_custos_variaveis = arquivo_custos_variaveis
         self.arquivo_custos_fixos = arquivo_custos_fixos
+        self.arquivo_regras_pedalada = arquivo_regras_pedalada
+        # Taxas reais (ex: conciliadas com o extrato da adquirente) substituem as estimadas
+        self.taxas_pagamento = {**TAXAS_PAGAMENTO_PADRAO, **(taxas_pagamento or {})}
 
     def processar_relatorio_mensal(self, arquivo_vendas, mes_referencia=None, 
                                  valor_pedaladas=0, salvar_resultado=True):
@@ -29,27 +58,8 @@ class CalculadoraMargemLucroComPedalada:
 
         print(f"📊 Processando relatório: {arquivo_vendas}")
         
-        # 1. Carregar dados
-        if arquivo_vendas.endswith('.xls'):
-            try:
-                vendas_df = pd.read_excel(arquivo_vendas, sheet_name=0, engine='xlrd')
-            except Exception as e:
-                print(f"⚠️ Erro ao ler .xls com xlrd: {e}. Tentando como HTML...")
-                try:
-                    # Tenta ler como HTML (comum em sistemas legados que exportam HTML com extensão .xls)
-                    # read_html retorna uma lista de dataframes
-                    dfs = pd.read_html(arquivo_vendas, decimal=',', thousands='.', header=0)
-                    if dfs:
-                        vendas_df = dfs[0] # Pega a primeira tabela
-                    else:
-                        raise ValueError("Nenhuma tabela encontrada no arquivo HTML/.xls")
-                except Exception as e_html:
-                     raise ValueError(f"Falha ao ler arquivo .xls (tanto como Excel quanto HTML): {e_html}")
-
-        elif arquivo_vendas.endswith('.xlsx'):
-            vendas_df = pd.read_excel(arquivo_vendas, sheet_name=0, engine='openpyxl')
-        else:
-            vendas_df = pd.read_csv(arquivo_vendas)
+        # 1. Carregar dados (detecta formato real, cabeçalho e nomes de coluna antes do parse completo)
+        vendas_df = ler_relatorio_vendas(arquivo_vendas)
 
         custos_var_df = pd.read_csv(self.arquivo_custos_variaveis)
         custos_fix_df = pd.read_csv(self.arquivo_custos_fixos)
@@ -57,33 +67,15 @@ class CalculadoraMargemLucroComPedalada:
         # 2. Limpar e validar dados de vendas (MOVIDO PARA ANTES DA DETECÇÃO)
         vendas_clean = self._limpar_dados_vendas(vendas_df)
 
-        # --- DETECÇÃO AUTOMÁTICA DE PEDALADA (Produção Cozinha Industrial) ---
-        # Identifica itens que devem ser tratados como pedalada e removidos da análise de produtos
-        mask_pedalada_auto = vendas_clean['Produto'].astype(str).str.contains("Produção Cozinha Industrial", case=False, na=False)
-        
-        # Calcular taxas sobre esses itens ANTES de remover
-        # Taxas: Débito 2%, Crédito/Outros 3%, Dinheiro 0%
-        df_pedalada = vendas_clean[mask_pedalada_auto].copy()
-        taxa_variavel_pedalada_auto = 0.0
-        
-        if not df_pedalada.empty:
-            taxa_debito = (df_pedalada['Débito'] * 0.02).sum()
-            taxa_credito = (df_pedalada['Crédito'] * 0.03).sum()
-            taxa_cashless = (df_pedalada['Cashless'] * 0.03).sum()
-            taxa_voucher = (df_pedalada['Voucher'] * 0.03).sum()
-            taxa_divisao = (df_pedalada['Divisão'] * 0.03).sum()
-            taxa_outros = (df_pedalada['Outros'] * 0.03).sum()
-            
-            taxa_variavel_pedalada_auto = taxa_debito + taxa_credito + taxa_cashless + taxa_voucher + taxa_divisao + taxa_outros
-            print(f"💳 Taxa variável sobre 'Produção Cozinha Industrial': R$ {taxa_variavel_pedalada_auto:.2f}")
+        # --- DETECÇÃO AUTOMÁTICA DE ITENS QUE NÃO SÃO RECEITA (tabela Regras_Pedalada.csv) ---
+        # Identifica pedaladas, consumo interno, testes etc. e remove da análise de produtos
+        auto = self._classificar_itens_nao_receita(vendas_clean, custos_var_df)
+        valor_pedalada_auto = auto['valor_pedalada_auto']
+        taxa_variavel_pedalada_auto = auto['taxa_variavel_pedalada_auto']
+
+        if auto['mascara'].any():
+            vendas_clean = vendas_clean[~auto['mascara']].copy()
 
-        valor_pedalada_auto = vendas_clean.loc[mask_pedalada_auto, 'Valor'].sum()
-        
-        # Remove esses itens do dataframe principal para não sujar a análise de produtos
-        if valor_pedalada_auto > 0:
-            print(f"⚠️  Detectado 'Produção Cozinha Industrial': R$ {valor_pedalada_auto:.2f} (Convertido para Pedalada)")
-            vendas_clean = vendas_clean[~mask_pedalada_auto].copy()
-            
         # Soma ao valor informado manualmente pelo usuário
         valor_pedaladas_total = valor_pedaladas + valor_pedalada_auto
 
@@ -102,11 +94,13 @@ class CalculadoraMargemLucroComPedalada:
 
         # 6. Calcular totais e resumo financeiro (COM tratamento de pedaladas)
         resumo = self._calcular_resumo_financeiro_com_pedaladas(
-            resultado, custos_fix_df, mes_referencia, valor_pedaladas_total, valor_pedalada_auto, taxa_variavel_pedalada_auto
+            resultado, custos_fix_df, mes_referencia, valor_pedaladas_total, valor_pedalada_auto, taxa_variavel_pedalada_auto,
+            auto['valor_excluido_auto'], auto['custo_insumos_nao_receita']
         )
         
         # Adiciona info da detecção automática ao resumo para exibir no front
         resumo['valor_pedalada_auto'] = valor_pedalada_auto
+        resumo['regras_nao_receita'] = auto['por_regra']
         
         # 8. Novos KPIs (Break-even e Comparativos)
         self._calcular_kpis_avancados(
@@ -130,15 +124,23 @@ class CalculadoraMargemLucroComPedalada:
 
         # Remover linhas de totais e vazias
         vendas_clean = vendas_df[~vendas_df['Produto'].isna()].copy()
-        vendas_clean = vendas_clean[vendas_clean['Categoria'] != 'Total Geral']
+        if 'Categoria' not in vendas_clean.columns:
+            vendas_clean['Categoria'] = 'Sem Categoria'
+        padrao_total = r'\s*total(\s+geral)?\s*$'
+        linha_total = (vendas_clean['Categoria'].astype(str).str.match(padrao_total, case=False, na=False) |
+                       vendas_clean['Produto'].astype(str).str.match(padrao_total, case=False, na=False))
+        vendas_clean = vendas_clean[~linha_total]
         vendas_clean = vendas_clean.dropna(subset=['Produto'])
+        vendas_clean['Produto'] = vendas_clean['Produto'].astype(str)
 
         # Converter colunas numéricas (incluindo formas de pagamento)
-        numeric_cols = ['Quantidade', 'Cashless', 'Débito', 'Crédito', 'Dinheiro', 
-                       'Voucher', 'Divisão', 'Outros', 'Desconto', 'Valor']
+        # Formas de pagamento ausentes no layout do PDV entram zeradas
+        numeric_cols = COLUNAS_NUMERICAS
 
         for col in numeric_cols:
-            if col in vendas_clean.columns:
+            if col not in vendas_clean.columns:
+                vendas_clean[col] = 0.0
+            elif vendas_clean[col].dtype.kind != 'f':
                 vendas_clean[col] = pd.to_numeric(vendas_clean[col], errors='coerce')
 
         # Preencher NaN com 0 para cálculos
@@ -149,6 +151,59 @@ class CalculadoraMargemLucroComPedalada:
         print(f"✅ Dados limpos: {len(vendas_clean)} produtos processados")
         return vendas_clean
 
+    def _classificar_itens_nao_receita(self, vendas_clean, custos_var_df):
+        """
+        Aplica as regras de itens que não são receita e consolida valores, taxas e custos
+        por regra. Taxas e custos usam o mesmo cálculo dos produtos (_calcular_metricas_produto_e_taxas).
+        """
+
+        classificacao = carregar_classificador(self.arquivo_regras_pedalada).classificar(vendas_clean)
+        mascara = classificacao['Regra'].notna()
+
+        auto = {
+            'mascara': mascara,
+            'valor_pedalada_auto': 0.0,
+            'taxa_variavel_pedalada_auto': 0.0,
+            'valor_excluido_auto': 0.0,
+            'custo_insumos_nao_receita': 0.0,
+            'por_regra': {},
+        }
+        if not mascara.any():
+            return auto
+
+        itens = vendas_clean[mascara].join(classificacao[mascara])
+        itens = itens.merge(custos_var_df, on='Produto', how='left')
+        itens['Custo_Insumo_Unitario'] = itens['Custo_Insumo_Unitario'].fillna(0)
+        itens = self._calcular_metricas_produto_e_taxas(itens)
+
+        # Taxas do cartão só não são pagas em itens ignorados; custo de insumos só conta em nao_receita
+        itens['Taxa_Aplicada'] = itens['Taxa_Total_Produto'].where(itens['Tratamento'] != 'ignorar', 0.0)
+        itens['Custo_Aplicado'] = itens['Custo_Total_Insumos'].where(itens['Tratamento'] == 'nao_receita', 0.0)
+
+        por_regra = itens.groupby(['Regra', 'Tratamento'], sort=False).agg(
+            itens=('Produto', 'size'),
+            valor=('Valor', 'sum'),
+            taxa=('Taxa_Aplicada', 'sum'),
+            custo_insumos=('Custo_Aplicado', 'sum'),
+        ).reset_index()
+
+        pedalada = itens['Tratamento'] == 'pedalada'
+        auto['valor_pedalada_auto'] = itens.loc[pedalada, 'Valor'].sum()
+        auto['valor_excluido_auto'] = itens.loc[~pedalada, 'Valor'].sum()
+        auto['taxa_variavel_pedalada_auto'] = itens['Taxa_Aplicada'].sum()
+        auto['custo_insumos_nao_receita'] = itens['Custo_Aplicado'].sum()
+        auto['por_regra'] = {
+            linha.Regra: {'tratamento': linha.Tratamento, 'itens': int(linha.itens), 'valor': linha.valor,
+                          'taxa': linha.taxa, 'custo_insumos': linha.custo_insumos}
+            for linha in por_regra.itertuples(index=False)
+        }
+
+        for regra, dados_regra in auto['por_regra'].items():
+            print(f"⚠️  Detectado '{regra}' ({dados_regra['tratamento']}): R$ {dados_regra['valor']:.2f} "
+                  f"| Taxa: R$ {dados_regra['taxa']:.2f} | Insumos: R$ {dados_regra['custo_insumos']:.2f}")
+
+        return auto
+
     def _verificar_produtos_sem_custo(self, vendas_clean, custos_var_df):
         """Verifica e alerta sobre produtos sem custo cadastrado"""
 
@@ -169,18 +224,15 @@ class CalculadoraMargemLucroComPedalada:
         # Calcular custos de insumos
         resultado['Custo_Total_Insumos'] = resultado['Quantidade'] * resultado['Custo_Insumo_Unitario']
 
-        # Calcular taxas por forma de pagamento por produto
-        # Dinheiro = 0% taxa
-        # Débito = 2% taxa
-        # Crédito = 3% taxa
-        # Cashless, Voucher, Divisão, Outros = assumir como crédito (3%)
+        # Calcular taxas por forma de pagamento por produto (ver TAXAS_PAGAMENTO_PADRAO)
+        taxas = self.taxas_pagamento
 
-        resultado['Taxa_Debito'] = resultado['Débito'] * 0.02
-        resultado['Taxa_Credito'] = resultado['Crédito'] * 0.03
-        resultado['Taxa_Cashless'] = resultado['Cashless'] * 0.03
-        resultado['Taxa_Voucher'] = resultado['Voucher'] * 0.03
-        resultado['Taxa_Divisao'] = resultado['Divisão'] * 0.03
-        resultado['Taxa_Outros'] = resultado['Outros'] * 0.03
+        resultado['Taxa_Debito'] = resultado['Débito'] * taxas['Débito']
+        resultado['Taxa_Credito'] = resultado['Crédito'] * taxas['Crédito']
+        resultado['Taxa_Cashless'] = resultado['Cashless'] * taxas['Cashless']
+        resultado['Taxa_Voucher'] = resultado['Voucher'] * taxas['Voucher']
+        resultado['Taxa_Divisao'] = resultado['Divisão'] * taxas['Divisão']
+        resultado['Taxa_Outros'] = resultado['Outros'] * taxas['Outros']
 
         # Taxa total por produto
         resultado['Taxa_Total_Produto'] = (resultado['Taxa_Debito'] + 
@@ -214,13 +266,15 @@ class CalculadoraMargemLucroComPedalada:
         
         return resultado
 
-    def _calcular_resumo_financeiro_com_pedaladas(self, resultado, custos_fix_df, mes_referencia, valor_pedaladas, valor_pedalada_auto=0, taxa_variavel_pedalada_auto=0):
+    def _calcular_resumo_financeiro_com_pedaladas(self, resultado, custos_fix_df, mes_referencia, valor_pedaladas, valor_pedalada_auto=0, taxa_variavel_pedalada_auto=0,
+                                                  valor_excluido_auto=0, custo_insumos_nao_receita=0):
         """Calcula o resumo financeiro completo COM tratamento de pedaladas"""
 
         # Totais básicos BRUTOS (antes de descontar pedaladas)
-        # A receita bruta do sistema deve incluir o que foi removido (auto pedalada)
-        receita_bruta_sistema = resultado['Valor'].sum() + valor_pedalada_auto
-        custo_insumos_total = resultado['Custo_Total_Insumos'].sum()
+        # A receita bruta do sistema deve incluir o que foi removido (auto pedalada e demais itens não-receita)
+        receita_bruta_sistema = resultado['Valor'].sum() + valor_pedalada_auto + valor_excluido_auto
+        # Insumos consumidos por itens não-receita (refeição de funcionário, cortesia) também são custo
+        custo_insumos_total = resultado['Custo_Total_Insumos'].sum() + custo_insumos_nao_receita
 
         # Totais por forma de pagamento BRUTOS
         total_dinheiro = resultado['Dinheiro'].sum()
@@ -234,13 +288,14 @@ class CalculadoraMargemLucroComPedalada:
         # AJUSTES PARA PEDALADAS
         # As pedaladas saem do crédito (pois foram passadas no cartão de crédito)
         total_credito_liquido = total_credito_bruto - valor_pedaladas
-        receita_bruta_real = receita_bruta_sistema - valor_pedaladas
+        receita_bruta_real = receita_bruta_sistema - valor_pedaladas - valor_excluido_auto
 
         # Calcular taxas (incluindo a taxa da pedalada que DEVE SER PAGA)
-        taxa_pedalada = valor_pedaladas * 0.03  # 3% sobre o valor da pedalada
+        taxa_credito = self.taxas_pagamento['Crédito']
+        taxa_pedalada = valor_pedaladas * taxa_credito  # taxa do crédito sobre o valor da pedalada
         taxa_total_debito = resultado['Taxa_Debito'].sum()
-        taxa_total_credito_liquido = total_credito_liquido * 0.03
-        taxa_total_credito_bruto = total_credito_bruto * 0.03  # Inclui taxa da pedalada
+        taxa_total_credito_liquido = total_credito_liquido * taxa_credito
+        taxa_total_credito_bruto = total_credito_bruto * taxa_credito  # Inclui taxa da pedalada
         taxa_total_cashless = resultado['Taxa_Cashless'].sum()
         taxa_total_voucher = resultado['Taxa_Voucher'].sum()
         taxa_total_divisao = resultado['Taxa_Divisao'].sum()
@@ -271,6 +326,7 @@ class CalculadoraMargemLucroComPedalada:
                  custos_variaveis_totais = (resultado[col_qtd] * resultado[col_custo]).sum()
             else:
                  custos_variaveis_totais = 0.0
+        custos_variaveis_totais += custo_insumos_nao_receita
 
         # Cálculos finais com receita REAL (descontada a pedalada)
         margem_bruta = receita_bruta_real - custo_insumos_total
@@ -293,6 +349,8 @@ class CalculadoraMargemLucroComPedalada:
             'valor_pedaladas': valor_pedaladas,
             'taxa_pedalada': taxa_pedalada,
             'taxa_variavel_pedalada_auto': taxa_variavel_pedalada_auto,
+            'valor_excluido_auto': valor_excluido_auto,
+            'custo_insumos_nao_receita': custo_insumos_nao_receita,
 
             'custo_insumos_total': custo_insumos_total,
             'custos_variaveis_totais': custos_variaveis_totais, # Adicionado para compatibilidade
@@ -317,6 +375,7 @@ class CalculadoraMargemLucroComPedalada:
             'taxa_total_divisao': taxa_total_divisao,
             'taxa_total_outros': taxa_total_outros,
             'taxa_total_geral': taxa_total_geral,
+            'taxas_pagamento': dict(self.taxas_pagamento),
 
             'lucro_liquido': lucro_liquido,
             'lucro_liquido_estimado': lucro_liquido, # Alias para compatibilidade
@@ -328,7 +387,7 @@ class CalculadoraMargemLucroComPedalada:
         }
 
     def _salvar_resultado(self, resultado, resumo, mes_referencia, valor_pedaladas):
-        """Salva o resultado em CSV"""
+        """Salva o resultado em CSV (escrita atômica via exportador)"""
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         nome_arquivo = f"margem_lucro_{mes_referencia or timestamp}.csv"
@@ -341,7 +400,7 @@ class CalculadoraMargemLucroComPedalada:
                                    'Taxa_Total_Produto', 'Receita_Liquida_Produto', 
                                    'Margem_Unitaria', 'Percentual_Margem_Produto']].copy()
 
-        resultado_salvar.to_csv(nome_arquivo, index=False, encoding='utf-8')
+        exportar_arquivo(resultado_salvar, resumo, nome_arquivo, formato='csv')
         print(f"💾 Resultado salvo em: {nome_arquivo}")
 
     def _exibir_relatorio(self, resumo, resultado, valor_pedaladas):
@@ -355,13 +414,18 @@ class CalculadoraMargemLucroComPedalada:
         print(f"⏰ Processado em: {resumo['data_processamento']}")
         print(f"🍽️  Produtos analisados: {resumo['produtos_processados']}")
 
+        # Taxas em % para os rótulos
+        taxas = {k: v * 100 for k, v in resumo.get('taxas_pagamento', TAXAS_PAGAMENTO_PADRAO).items()}
+
         if valor_pedaladas > 0:
             print("\\n💳 AJUSTES POR PEDALADAS:")
             print(f"   Receita bruta (sistema): R$ {resumo['receita_bruta_sistema']:>12,.2f}")
             print(f"   Pedaladas (desconto):    R$ {resumo['valor_pedaladas']:>12,.2f}")
-            print(f"   Taxa da pedalada (3%):   R$ {resumo['taxa_pedalada']:>12,.2f}")
+            print(f"   Taxa da pedalada ({taxas['Crédito']:.1f}%): R$ {resumo['taxa_pedalada']:>12,.2f}")
             if resumo.get('taxa_variavel_pedalada_auto', 0) > 0:
-                print(f"   Taxa var. (Cozinha):     R$ {resumo['taxa_variavel_pedalada_auto']:>12,.2f}")
+                print(f"   Taxa var. (auto):        R$ {resumo['taxa_variavel_pedalada_auto']:>12,.2f}")
+            if resumo.get('valor_excluido_auto', 0) > 0:
+                print(f"   Itens não-receita:       R$ {resumo['valor_excluido_auto']:>12,.2f}")
             print("-" * 90)
             print(f"   Receita bruta REAL:      R$ {resumo['receita_bruta_real']:>12,.2f}")
 
@@ -376,23 +440,23 @@ class CalculadoraMargemLucroComPedalada:
 
         print("\\n💳 DETALHAMENTO POR FORMA DE PAGAMENTO:")
         print(f"   Dinheiro (0% taxa):  R$ {resumo['total_dinheiro']:>10,.2f} | Taxa: R$ {0:>8,.2f}")
-        print(f"   Débito (2% taxa):    R$ {resumo['total_debito']:>10,.2f} | Taxa: R$ {resumo['taxa_total_debito']:>8,.2f}")
+        print(f"   Débito ({taxas['Débito']:.1f}% taxa):  R$ {resumo['total_debito']:>10,.2f} | Taxa: R$ {resumo['taxa_total_debito']:>8,.2f}")
 
         if valor_pedaladas > 0:
             print(f"   Crédito BRUTO:       R$ {resumo['total_credito_bruto']:>10,.2f} | Taxa: R$ {resumo['taxa_total_credito_bruto']:>8,.2f}")
             print(f"   Pedaladas:          -R$ {resumo['valor_pedaladas']:>10,.2f} | Taxa: R$ {resumo['taxa_pedalada']:>8,.2f}")
             print(f"   Crédito LÍQUIDO:     R$ {resumo['total_credito_liquido']:>10,.2f} | Taxa: R$ {resumo['taxa_total_credito_liquido']:>8,.2f}")
         else:
-            print(f"   Crédito (3% taxa):   R$ {resumo['total_credito_bruto']:>10,.2f} | Taxa: R$ {resumo['taxa_total_credito_bruto']:>8,.2f}")
+            print(f"   Crédito ({taxas['Crédito']:.1f}% taxa): R$ {resumo['total_credito_bruto']:>10,.2f} | Taxa: R$ {resumo['taxa_total_credito_bruto']:>8,.2f}")
 
-        print(f"   Cashless (3% taxa):  R$ {resumo['total_cashless']:>10,.2f} | Taxa: R$ {resumo['taxa_total_cashless']:>8,.2f}")
+        print(f"   Cashless ({taxas['Cashless']:.1f}% taxa): R$ {resumo['total_cashless']:>10,.2f} | Taxa: R$ {resumo['taxa_total_cashless']:>8,.2f}")
 
         if resumo['total_voucher'] > 0:
-            print(f"   Voucher (3% taxa):   R$ {resumo['total_voucher']:>10,.2f} | Taxa: R$ {resumo['taxa_total_voucher']:>8,.2f}")
+            print(f"   Voucher ({taxas['Voucher']:.1f}% taxa): R$ {resumo['total_voucher']:>10,.2f} | Taxa: R$ {resumo['taxa_total_voucher']:>8,.2f}")
         if resumo['total_divisao'] > 0:
-            print(f"   Divisão (3% taxa):   R$ {resumo['total_divisao']:>10,.2f} | Taxa: R$ {resumo['taxa_total_divisao']:>8,.2f}")
+            print(f"   Divisão ({taxas['Divisão']:.1f}% taxa): R$ {resumo['total_divisao']:>10,.2f} | Taxa: R$ {resumo['taxa_total_divisao']:>8,.2f}")
         if resumo['total_outros'] > 0:
-            print(f"   Outros (3% taxa):    R$ {resumo['total_outros']:>10,.2f} | Taxa: R$ {resumo['taxa_total_outros']:>8,.2f}")
+            print(f"   Outros ({taxas['Outros']:.1f}% taxa):  R$ {resumo['total_outros']:>10,.2f} | Taxa: R$ {resumo['taxa_total_outros']:>8,.2f}")
 
         print(f"\\n🎯 INDICADORES:")
         print(f"   Ticket médio real: R$ {resumo['ticket_medio_real']:.2f}")
@@ -424,13 +488,7 @@ class CalculadoraMargemLucroComPedalada:
         # 1. Break-even Point (Ponto de Equilíbrio)
         # Fórmula: Custos Fixos / Margem de Contribuição (%)
         margem_contrib_percentual = (margem_bruta / receita_bruta_real) if receita_bruta_real > 0 else 0
-        
-        if margem_contrib_percentual > 0:
-            break_even = custos_fixos_total / margem_contrib_percentual
-        else:
-            break_even = 0
-            
-        resumo['kpi_break_even'] = break_even
+        resumo['kpi_break_even'] = ponto_equilibrio(custos_fixos_total, margem_bruta, receita_bruta_real)
         resumo['kpi_margem_contrib_percentual'] = margem_contrib_percentual * 100
 
         # 2. CMV (Custo da Mercadoria Vendida) %
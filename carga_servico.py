@@ -0,0 +1,87 @@
+"""
+Teste de carga local do serviço de cálculo (servico_calculo.py).
+
+Simula vários gestores enviando relatórios ao mesmo tempo e mede latência e vazão.
+
+    python servico_calculo.py --workers 4 &
+    python carga_servico.py vendas.csv --usuarios 20 --pedidos 10
+    python carga_servico.py vendas.csv --usuarios 20 --pedidos 10 --sem-cache   # força recálculo
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from servico_calculo import PORTA_PADRAO, processar_remoto
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def executar_carga(url, conteudo, nome_arquivo, usuarios, pedidos_por_usuario, sem_cache=False):
+    """
+    Returns:
+        dict com latências (s), erros e duração total
+    """
+    def usuario(indice):
+        latencias, erros = [], []
+        for pedido in range(pedidos_por_usuario):
+            # Pedaladas diferentes por pedido geram chaves diferentes (sem acerto de cache)
+            pedaladas = (indice * pedidos_por_usuario + pedido) * 0.01 if sem_cache else 0
+            inicio = time.perf_counter()
+            try:
+                processar_remoto(url, conteudo, nome_arquivo, 'Janeiro/2025', pedaladas)
+                latencias.append(time.perf_counter() - inicio)
+            except Exception as e:
+                erros.append(str(e))
+        return latencias, erros
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=usuarios) as executor:
+        resultados = list(executor.map(usuario, range(usuarios)))
+    duracao = time.perf_counter() - inicio
+
+    return {
+        'latencias': [l for latencias, _ in resultados for l in latencias],
+        'erros': [e for _, erros in resultados for e in erros],
+        'duracao': duracao,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do serviço de cálculo")
+    parser.add_argument('arquivo_vendas')
+    parser.add_argument('--url', default=f"http://127.0.0.1:{PORTA_PADRAO}")
+    parser.add_argument('--usuarios', type=int, default=10, help="gestores simultâneos")
+    parser.add_argument('--pedidos', type=int, default=5, help="pedidos por gestor")
+    parser.add_argument('--sem-cache', action='store_true', help="cada pedido com parâmetros diferentes")
+    args = parser.parse_args()
+
+    with open(args.arquivo_vendas, 'rb') as arquivo:
+        conteudo = arquivo.read()
+
+    print(f"🏋️  {args.usuarios} usuários x {args.pedidos} pedidos em {args.url} "
+          f"({'sem' if args.sem_cache else 'com'} cache)")
+    carga = executar_carga(args.url, conteudo, os.path.basename(args.arquivo_vendas),
+                           args.usuarios, args.pedidos, args.sem_cache)
+
+    latencias = carga['latencias']
+    if latencias:
+        print(f"✅ {len(latencias)} pedidos em {carga['duracao']:.2f}s ({len(latencias) / carga['duracao']:.1f} pedidos/s)")
+        print(f"   Latência p50: {statistics.median(latencias) * 1000:.0f} ms | "
+              f"p95: {_percentil(latencias, 95) * 1000:.0f} ms | máx: {max(latencias) * 1000:.0f} ms")
+    if carga['erros']:
+        print(f"❌ {len(carga['erros'])} erro(s). Primeiro: {carga['erros'][0]}")
+
+    with urllib.request.urlopen(f"{args.url.rstrip('/')}/saude") as resposta:
+        print(f"📊 Serviço: {json.loads(resposta.read())}")
+
+
+if __name__ == '__main__':
+    main()
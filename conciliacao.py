@@ -0,0 +1,242 @@
+"""
+Conciliação do fechamento do mês com o extrato da adquirente/banco (CSV ou OFX).
+
+O extrato é normalizado para uma linha por lançamento (Data_Venda, Metodo, Valor_Bruto,
+Taxa, Valor_Liquido). Taxa fica NaN quando o extrato não a informa (só valores líquidos);
+nesse caso o bruto é o próprio líquido e a forma de pagamento não tem taxa real. Cada lançamento é atribuído ao mês de competência com um
+merge_asof ordenado por data (por forma de pagamento) e o total do mês é comparado
+com o que a calculadora estimou. As taxas efetivas encontradas podem ser devolvidas
+à CalculadoraMargemLucroComPedalada (parâmetro `taxas_pagamento`).
+"""
+
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+from layout_vendas import decodificar, detectar_separador, normalizar_nome
+from previsao import converter_mes_referencia
+
+# Nome canônico -> apelidos aceitos no CSV do extrato
+APELIDOS_EXTRATO = {
+    'Data_Venda': ['data da venda', 'data venda', 'data da transacao', 'data transacao'],
+    'Data_Pagamento': ['data', 'data de pagamento', 'data pagamento', 'data do credito', 'data de liquidacao', 'data prevista'],
+    'Metodo': ['modalidade', 'forma de pagamento', 'tipo', 'produto', 'tipo de transacao', 'meio de pagamento'],
+    'Valor_Bruto': ['valor bruto', 'bruto', 'valor da venda', 'valor venda'],
+    'Taxa': ['taxa', 'tarifa', 'mdr', 'valor da taxa', 'desconto'],
+    'Valor_Liquido': ['valor liquido', 'liquido', 'valor a receber', 'valor pago'],
+}
+
+# Texto do extrato -> forma de pagamento da calculadora (primeiro que casar vence)
+PADROES_METODO = [
+    ('Débito', re.compile(r'd[eé]bito|maestro|electron', re.IGNORECASE)),
+    ('Voucher', re.compile(r'voucher|vale|alimenta[çc][ãa]o|refei[çc][ãa]o', re.IGNORECASE)),
+    ('Crédito', re.compile(r'cr[eé]dito|parcelad|[àa] vista', re.IGNORECASE)),
+]
+METODO_PADRAO = 'Outros'
+
+# Taxas OFX cujo texto não diz a forma de pagamento: aparecem na conciliação, mas não viram taxa de nenhuma
+METODO_NAO_ATRIBUIDO = 'Taxas não atribuídas'
+
+# Dias entre a venda e a liquidação, usados quando o extrato só traz a data de pagamento
+PRAZO_LIQUIDACAO_DIAS = {'Débito': 1, 'Crédito': 30, 'Voucher': 30, 'Outros': 1}
+
+# Lançamentos OFX negativos com esse texto são taxas
+PADRAO_TAXA_OFX = re.compile(r'taxa|tarifa|mdr|aluguel', re.IGNORECASE)
+
+# Chaves do resumo (bruto, taxa estimada) por forma de pagamento
+CHAVES_RESUMO = {
+    'Débito': ('total_debito', 'taxa_total_debito'),
+    'Crédito': ('total_credito_bruto', 'taxa_total_credito_bruto'),
+    'Cashless': ('total_cashless', 'taxa_total_cashless'),
+    'Voucher': ('total_voucher', 'taxa_total_voucher'),
+    'Divisão': ('total_divisao', 'taxa_total_divisao'),
+    'Outros': ('total_outros', 'taxa_total_outros'),
+}
+
+
+def classificar_metodo(textos):
+    """Série de textos livres -> forma de pagamento canônica (vetorizado, um padrão por vez)"""
+    textos = pd.Series(textos).astype(str)
+    metodo = pd.Series(METODO_PADRAO, index=textos.index, dtype=object)
+    livre = pd.Series(True, index=textos.index)
+    for nome, padrao in PADROES_METODO:
+        casou = livre & textos.str.contains(padrao, na=False)
+        metodo[casou] = nome
+        livre &= ~casou
+    return metodo
+
+
+def _numero_br(serie):
+    """'1.234,56' / '1234.56' / 'R$ -12,30' -> float"""
+    if serie.dtype.kind in 'fi':
+        return serie.astype(float)
+    texto = serie.astype(str).str.replace(r'[^\d,.\-]', '', regex=True)
+    brasileiro = texto.str.contains(r',\d{1,2}$', na=False)
+    texto = texto.where(~brasileiro, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def _ler_extrato_csv(texto):
+    linhas = texto.splitlines()
+    separador = detectar_separador(linhas[:30])
+    df = pd.read_csv(io.StringIO(texto), sep=separador, dtype=str)
+
+    renomear = {}
+    for coluna in df.columns:
+        nome = normalizar_nome(coluna)
+        for canonico, apelidos in APELIDOS_EXTRATO.items():
+            if nome in apelidos and canonico not in renomear.values():
+                renomear[coluna] = canonico
+                break
+    df = df.rename(columns=renomear)[list(dict.fromkeys(renomear.values()))]
+
+    if 'Data_Venda' not in df.columns and 'Data_Pagamento' not in df.columns:
+        raise ValueError(f"Extrato sem coluna de data. Colunas reconhecidas: {list(APELIDOS_EXTRATO)}")
+    if 'Valor_Bruto' not in df.columns and 'Valor_Liquido' not in df.columns:
+        raise ValueError("Extrato sem coluna de valor bruto ou líquido")
+
+    extrato = pd.DataFrame(index=df.index)
+    for coluna in ('Data_Venda', 'Data_Pagamento'):
+        if coluna in df.columns:
+            extrato[coluna] = pd.to_datetime(df[coluna], dayfirst=True, errors='coerce')
+    extrato['Metodo'] = classificar_metodo(df['Metodo']) if 'Metodo' in df.columns else METODO_PADRAO
+    for coluna in ('Valor_Bruto', 'Taxa', 'Valor_Liquido'):
+        extrato[coluna] = _numero_br(df[coluna]) if coluna in df.columns else np.nan
+
+    # Completa o que faltar: bruto = líquido + taxa (taxa sempre positiva). Sem taxa nem os dois
+    # valores, a taxa fica desconhecida (NaN) e um valor substitui o outro
+    extrato['Taxa'] = extrato['Taxa'].abs()
+    extrato['Taxa'] = extrato['Taxa'].fillna(extrato['Valor_Bruto'] - extrato['Valor_Liquido'])
+    extrato['Valor_Bruto'] = extrato['Valor_Bruto'].fillna(extrato['Valor_Liquido'] + extrato['Taxa'].fillna(0))
+    extrato['Valor_Liquido'] = extrato['Valor_Liquido'].fillna(extrato['Valor_Bruto'] - extrato['Taxa'].fillna(0))
+    return extrato
+
+
+def _ler_extrato_ofx(texto):
+    """
+    OFX (SGML ou XML): um lançamento por <STMTTRN>; negativos com 'taxa/tarifa' viram taxa.
+    Créditos são líquidos: a taxa deles fica NaN e só as linhas de taxa informam a taxa real.
+    """
+    blocos = re.findall(r'<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|(?=</BANKTRANLIST>))', texto, re.IGNORECASE | re.DOTALL)
+
+    def campo(tag):
+        padrao = re.compile(rf'<{tag}>\s*([^<\r\n]*)', re.IGNORECASE)
+        return [(m.group(1).strip() if (m := padrao.search(b)) else '') for b in blocos]
+
+    lancamentos = pd.DataFrame({
+        'Data_Pagamento': pd.to_datetime(pd.Series(campo('DTPOSTED')).str[:8], format='%Y%m%d', errors='coerce'),
+        'Valor': pd.to_numeric(pd.Series(campo('TRNAMT')).str.replace(',', '.', regex=False), errors='coerce'),
+        'Texto': pd.Series(campo('MEMO')) + ' ' + pd.Series(campo('NAME')),
+    })
+    lancamentos['Metodo'] = classificar_metodo(lancamentos['Texto'])
+    taxa = (lancamentos['Valor'] < 0) & lancamentos['Texto'].str.contains(PADRAO_TAXA_OFX, na=False)
+    lancamentos.loc[taxa & (lancamentos['Metodo'] == METODO_PADRAO), 'Metodo'] = METODO_NAO_ATRIBUIDO
+
+    return pd.DataFrame({
+        'Data_Pagamento': lancamentos['Data_Pagamento'],
+        'Metodo': lancamentos['Metodo'],
+        'Valor_Liquido': lancamentos['Valor'].where(~taxa, 0.0),
+        'Taxa': (-lancamentos['Valor']).where(taxa),
+    }).assign(Valor_Bruto=lambda d: d['Valor_Liquido'] + d['Taxa'].fillna(0))[lambda d: (d['Valor_Liquido'] > 0) | (d['Taxa'] > 0)]
+
+
+def ler_extrato(arquivo):
+    """
+    Lê um extrato de liquidação (caminho ou arquivo aberto/bytes), CSV ou OFX.
+
+    Returns:
+        DataFrame com Data_Venda, Metodo, Valor_Bruto, Taxa, Valor_Liquido
+    """
+    if isinstance(arquivo, (bytes, bytearray)):
+        conteudo = bytes(arquivo)
+    elif hasattr(arquivo, 'read'):
+        conteudo = arquivo.read()
+    else:
+        with open(arquivo, 'rb') as f:
+            conteudo = f.read()
+    texto, _ = decodificar(conteudo)
+
+    if re.search(r'OFXHEADER|<OFX>', texto[:4096], re.IGNORECASE):
+        extrato = _ler_extrato_ofx(texto)
+    else:
+        extrato = _ler_extrato_csv(texto)
+
+    # Sem data da venda: estima pela data de pagamento menos o prazo de liquidação do método
+    if 'Data_Venda' not in extrato.columns:
+        extrato['Data_Venda'] = pd.NaT
+    prazo = pd.to_timedelta(extrato['Metodo'].map(PRAZO_LIQUIDACAO_DIAS).fillna(1), unit='D')
+    if 'Data_Pagamento' in extrato.columns:
+        extrato['Data_Venda'] = extrato['Data_Venda'].fillna(extrato['Data_Pagamento'] - prazo)
+
+    return extrato.dropna(subset=['Data_Venda'])[['Data_Venda', 'Metodo', 'Valor_Bruto', 'Taxa', 'Valor_Liquido']]
+
+
+def atribuir_competencia(extrato):
+    """
+    Atribui cada lançamento ao mês de competência (1º dia do mês da venda) com um
+    merge_asof ordenado: uma única passada sobre o extrato, mesmo com dezenas de milhares de linhas.
+    """
+    extrato = extrato.sort_values('Data_Venda', kind='stable')
+    inicio = extrato['Data_Venda'].min().to_period('M').to_timestamp()
+    fim = extrato['Data_Venda'].max().to_period('M').to_timestamp()
+    meses = pd.DataFrame({'Competencia': pd.date_range(inicio, fim, freq='MS').astype(extrato['Data_Venda'].dtype)})
+    return pd.merge_asof(extrato, meses, left_on='Data_Venda', right_on='Competencia', direction='backward')
+
+
+def conciliar(resumo, extrato, mes_referencia=None):
+    """
+    Compara, por forma de pagamento, o bruto e as taxas estimadas no `resumo` com o extrato do mesmo mês.
+
+    Returns:
+        DataFrame com uma linha por forma de pagamento: Bruto_Estimado, Bruto_Extrato, Taxa_Estimada,
+        Taxa_Real, Diferenca_Taxa, Taxa_Estimada_Percentual, Taxa_Real_Percentual
+        (Taxa_Real e derivadas ficam NaN quando o extrato não traz taxa da forma de pagamento)
+    """
+    mes_referencia = mes_referencia or resumo.get('mes_referencia')
+    competencia = converter_mes_referencia(mes_referencia)
+    if pd.isna(competencia):
+        competencia = pd.to_datetime(str(mes_referencia), format='%Y-%m', errors='coerce')
+    if pd.isna(competencia):
+        raise ValueError(f"Mês de referência não reconhecido para conciliação: {mes_referencia}")
+
+    if extrato.empty:
+        do_mes = extrato.assign(Competencia=pd.NaT)
+    else:
+        do_mes = atribuir_competencia(extrato)
+        do_mes = do_mes[do_mes['Competencia'] == pd.Timestamp(competencia)]
+    real = do_mes.groupby('Metodo')[['Valor_Bruto', 'Valor_Liquido']].sum()
+    real['Taxa'] = do_mes.groupby('Metodo')['Taxa'].sum(min_count=1)
+
+    estimado = pd.DataFrame(
+        [(metodo, resumo.get(bruto, 0), resumo.get(taxa, 0)) for metodo, (bruto, taxa) in CHAVES_RESUMO.items()],
+        columns=['Metodo', 'Bruto_Estimado', 'Taxa_Estimada']
+    ).set_index('Metodo')
+
+    tabela = estimado.join(real.rename(columns={'Valor_Bruto': 'Bruto_Extrato', 'Taxa': 'Taxa_Real',
+                                                'Valor_Liquido': 'Liquido_Extrato'}), how='outer')
+    sem_taxa = tabela['Taxa_Real'].isna()
+    tabela = tabela.fillna(0)
+    tabela.loc[sem_taxa, 'Taxa_Real'] = np.nan
+    tabela['Diferenca_Bruto'] = tabela['Bruto_Extrato'] - tabela['Bruto_Estimado']
+    tabela['Diferenca_Taxa'] = tabela['Taxa_Real'] - tabela['Taxa_Estimada']
+    tabela['Taxa_Estimada_Percentual'] = (tabela['Taxa_Estimada'] / tabela['Bruto_Estimado'].where(tabela['Bruto_Estimado'] > 0) * 100).fillna(0)
+    tabela['Taxa_Real_Percentual'] = tabela['Taxa_Real'] / tabela['Bruto_Extrato'].where(tabela['Bruto_Extrato'] > 0) * 100
+    tabela.loc[~sem_taxa, 'Taxa_Real_Percentual'] = tabela.loc[~sem_taxa, 'Taxa_Real_Percentual'].fillna(0)
+    # Taxa sem forma de pagamento não tem bruto de referência: entra só no total
+    tabela.loc[tabela.index == METODO_NAO_ATRIBUIDO, 'Taxa_Real_Percentual'] = np.nan
+    return tabela.reset_index()
+
+
+def taxas_conciliadas(conciliacao, taxas_atuais):
+    """
+    Taxas efetivas do extrato no formato de `taxas_pagamento` da calculadora.
+    Formas de pagamento sem movimento ou sem taxa informada no extrato mantêm a taxa atual.
+    """
+    taxas = dict(taxas_atuais)
+    com_movimento = conciliacao[(conciliacao['Bruto_Extrato'] > 0) & conciliacao['Taxa_Real'].notna()
+                                & conciliacao['Metodo'].isin(list(taxas))]
+    for linha in com_movimento.itertuples(index=False):
+        taxas[linha.Metodo] = float(linha.Taxa_Real / linha.Bruto_Extrato)
+    return taxas
@@ -0,0 +1,261 @@
+import io
+import json
+import math
+import os
+import stat
+import tempfile
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Linhas escritas por vez (evita materializar a tabela inteira no formato de saída)
+TAMANHO_CHUNK = 5000
+
+# Chaves do resumo formatadas como percentual na planilha
+CHAVES_PERCENTUAIS = ('percentual', 'kpi_margem_contrib_percentual', 'kpi_cmv_percentual')
+
+# Chaves do resumo guardadas como fração (0.03 = 3%)
+CHAVES_FRACAO = ('taxas_pagamento.',)
+
+
+def _valor_json(valor):
+    """Converte tipos numpy/pandas para tipos nativos serializáveis (NaN/inf viram None: JSON estrito não os tem)"""
+    if isinstance(valor, dict):
+        return {str(k): _valor_json(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple, np.ndarray)):
+        return [_valor_json(v) for v in valor]
+    if isinstance(valor, np.datetime64):
+        valor = pd.Timestamp(valor)
+    elif isinstance(valor, np.generic):
+        # np.bool_, np.int64, np.float32, np.str_... -> bool/int/float/str nativos
+        valor = valor.item()
+    if valor is pd.NaT or valor is pd.NA:
+        return None
+    if isinstance(valor, float):
+        return valor if math.isfinite(valor) else None
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return valor
+
+
+def achatar_resumo(resumo, prefixo=''):
+    """Transforma o resumo em pares (chave, valor), abrindo dicionários aninhados (ex: custos fixos, regras)"""
+    linhas = []
+    for chave, valor in resumo.items():
+        chave = f"{prefixo}{chave}"
+        if isinstance(valor, dict):
+            linhas.extend(achatar_resumo(valor, prefixo=f"{chave}."))
+        else:
+            valor = _valor_json(valor)
+            # Listas não cabem numa célula: vão como texto JSON
+            linhas.append((chave, json.dumps(valor, ensure_ascii=False) if isinstance(valor, list) else valor))
+    return linhas
+
+
+def _chunks(df, tamanho=TAMANHO_CHUNK):
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+
+class Exportador:
+    """Base dos exportadores: subclasses implementam `escrever(resultado, resumo, arquivo)` sobre um arquivo binário aberto"""
+
+    extensao = ''
+    mime = 'application/octet-stream'
+    dependencia = None
+
+    @classmethod
+    def disponivel(cls):
+        if cls.dependencia is None:
+            return True
+        try:
+            __import__(cls.dependencia)
+            return True
+        except ImportError:
+            return False
+
+    def escrever(self, resultado, resumo, arquivo):
+        raise NotImplementedError
+
+
+class ExportadorCSV(Exportador):
+    """Só a tabela por produto (mesmo formato do antigo margem_lucro_<mes>.csv)"""
+
+    extensao = 'csv'
+    mime = 'text/csv'
+
+    def escrever(self, resultado, resumo, arquivo):
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8', newline='')
+        for i, chunk in enumerate(_chunks(resultado)):
+            chunk.to_csv(texto, index=False, header=(i == 0))
+        if resultado.empty:
+            resultado.to_csv(texto, index=False)
+        texto.flush()
+        texto.detach()
+
+
+class ExportadorJSON(Exportador):
+    """{"resumo": {...}, "produtos": [...]}, com os produtos escritos em blocos"""
+
+    extensao = 'json'
+    mime = 'application/json'
+
+    def escrever(self, resultado, resumo, arquivo):
+        cabecalho = json.dumps({'resumo': _valor_json(resumo)}, ensure_ascii=False, allow_nan=False)
+        arquivo.write(cabecalho[:-1].encode('utf-8'))
+        arquivo.write(b', "produtos": [')
+        primeiro = True
+        for chunk in _chunks(resultado):
+            registros = chunk.to_json(orient='records', force_ascii=False)[1:-1]
+            if not registros:
+                continue
+            if not primeiro:
+                arquivo.write(b',')
+            arquivo.write(registros.encode('utf-8'))
+            primeiro = False
+        arquivo.write(b']}')
+
+
+class ExportadorParquet(Exportador):
+    """Tabela por produto em row groups; o resumo vai como metadado (JSON) do schema"""
+
+    extensao = 'parquet'
+    mime = 'application/vnd.apache.parquet'
+    dependencia = 'pyarrow'
+
+    def escrever(self, resultado, resumo, arquivo):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.Schema.from_pandas(resultado, preserve_index=False)
+        metadados = dict(schema.metadata or {})
+        metadados[b'resumo'] = json.dumps(_valor_json(resumo), ensure_ascii=False, allow_nan=False).encode('utf-8')
+        schema = schema.with_metadata(metadados)
+
+        with pq.ParquetWriter(arquivo, schema) as writer:
+            for chunk in _chunks(resultado):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+class ExportadorXLSX(Exportador):
+    """Planilha 'Resumo' formatada + planilha 'Produtos' (modo write_only, linha a linha)"""
+
+    extensao = 'xlsx'
+    mime = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    dependencia = 'openpyxl'
+
+    def escrever(self, resultado, resumo, arquivo):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
+
+        wb = Workbook(write_only=True)
+        negrito = Font(bold=True, color='FFFFFF')
+        fundo = PatternFill('solid', fgColor='1E2329')
+
+        # 1. Resumo
+        ws_resumo = wb.create_sheet('Resumo')
+        ws_resumo.column_dimensions['A'].width = 40
+        ws_resumo.column_dimensions['B'].width = 22
+        cabecalho = []
+        for titulo in ('Indicador', 'Valor'):
+            celula = WriteOnlyCell(ws_resumo, value=titulo)
+            celula.font = negrito
+            celula.fill = fundo
+            cabecalho.append(celula)
+        ws_resumo.append(cabecalho)
+
+        for chave, valor in achatar_resumo(resumo):
+            celula_valor = WriteOnlyCell(ws_resumo, value=valor)
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                if chave.startswith(CHAVES_FRACAO):
+                    celula_valor.number_format = '0.00%'
+                elif any(p in chave for p in CHAVES_PERCENTUAIS):
+                    celula_valor.number_format = '0.00"%"'
+                elif chave != 'produtos_processados' and not chave.endswith('.itens'):
+                    celula_valor.number_format = '"R$" #,##0.00'
+            ws_resumo.append([chave, celula_valor])
+
+        # 2. Produtos
+        ws_produtos = wb.create_sheet('Produtos')
+        cabecalho = []
+        for coluna in resultado.columns:
+            celula = WriteOnlyCell(ws_produtos, value=str(coluna))
+            celula.font = negrito
+            celula.fill = fundo
+            cabecalho.append(celula)
+        ws_produtos.append(cabecalho)
+
+        for chunk in _chunks(resultado):
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for linha in chunk.itertuples(index=False, name=None):
+                ws_produtos.append([_valor_json(v) for v in linha])
+
+        wb.save(arquivo)
+
+
+# Registro de formatos: novos exportadores entram aqui
+EXPORTADORES = {
+    'csv': ExportadorCSV,
+    'json': ExportadorJSON,
+    'parquet': ExportadorParquet,
+    'xlsx': ExportadorXLSX,
+}
+
+
+def formatos_disponiveis():
+    """Formatos cujas dependências estão instaladas"""
+    return [nome for nome, cls in EXPORTADORES.items() if cls.disponivel()]
+
+
+def _obter_exportador(formato):
+    if formato not in EXPORTADORES:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}. Use um de {list(EXPORTADORES)}")
+    cls = EXPORTADORES[formato]
+    if not cls.disponivel():
+        raise ImportError(f"Exportação em {formato} requer o pacote '{cls.dependencia}'")
+    return cls()
+
+
+def exportar_bytes(resultado, resumo, formato):
+    """Gera o arquivo em memória (para download), sem tocar no disco"""
+    buffer = io.BytesIO()
+    _obter_exportador(formato).escrever(resultado, resumo, buffer)
+    return buffer.getvalue()
+
+
+# Lida uma vez ao importar: trocar a umask depois não é seguro com várias threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def modo_arquivo(caminho):
+    """Permissão que `caminho` deve ter ao ser reescrito: a atual, ou o padrão de um arquivo novo (0666 menos a umask)"""
+    try:
+        return stat.S_IMODE(os.stat(caminho).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def exportar_arquivo(resultado, resumo, caminho, formato=None):
+    """
+    Escreve em disco de forma atômica: grava num temporário do mesmo diretório
+    e só substitui `caminho` quando a escrita terminou sem erro.
+    """
+    formato = formato or os.path.splitext(caminho)[1].lstrip('.').lower()
+    exportador = _obter_exportador(formato)
+
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=f".{exportador.extensao}.tmp")
+    try:
+        with os.fdopen(fd, 'wb') as arquivo:
+            exportador.escrever(resultado, resumo, arquivo)
+        # mkstemp cria com 0600; o arquivo final mantém a permissão de antes
+        os.chmod(temporario, modo_arquivo(caminho))
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return caminho
@@ -0,0 +1,280 @@
+"""
+Detecção do layout do relatório de vendas do PDV antes do parse completo.
+
+Só o começo do arquivo é inspecionado (formato real, codificação, separador, linha
+de cabeçalho e mapeamento de nomes de coluna). O parse final lê apenas as colunas
+necessárias, já com os tipos definidos. Se o layout não for reconhecido o erro sai
+aqui, antes do trabalho pesado.
+"""
+
+import codecs
+import csv
+import io
+import re
+import unicodedata
+import zipfile
+from collections import Counter
+
+import pandas as pd
+
+# Quanto do arquivo é lido para descobrir o layout
+BYTES_AMOSTRA = 64 * 1024
+LINHAS_AMOSTRA = 30
+
+# Nome canônico -> apelidos aceitos (comparados sem acento, caixa ou pontuação)
+APELIDOS_COLUNAS = {
+    'Categoria': ['categoria', 'grupo', 'familia', 'departamento'],
+    'Produto': ['produto', 'item', 'descricao', 'descricao do produto', 'nome do produto'],
+    'Quantidade': ['quantidade', 'qtd', 'qtde', 'quant'],
+    'Cashless': ['cashless'],
+    'Débito': ['debito', 'cartao de debito'],
+    'Crédito': ['credito', 'cartao de credito'],
+    'Dinheiro': ['dinheiro', 'especie'],
+    'Voucher': ['voucher', 'vale', 'vale refeicao'],
+    'Divisão': ['divisao'],
+    'Outros': ['outros', 'outras'],
+    'Desconto': ['desconto', 'descontos'],
+    'Valor': ['valor', 'valor total', 'total', 'total vendido'],
+}
+
+COLUNAS_OBRIGATORIAS = ['Produto', 'Valor']
+COLUNAS_NUMERICAS = ['Quantidade', 'Cashless', 'Débito', 'Crédito', 'Dinheiro',
+                     'Voucher', 'Divisão', 'Outros', 'Desconto', 'Valor']
+
+# Marcadores de célula vazia usados pelos PDVs nas colunas numéricas
+VALORES_VAZIOS = ['-', '--', '—']
+
+
+class ArquivoVendasInvalido(ValueError):
+    """O relatório enviado não é legível ou não tem o layout esperado (erro de quem enviou, não do código)"""
+
+
+def normalizar_nome(texto):
+    """'Débito (R$)' -> 'debito r'; usado para comparar cabeçalhos com os apelidos"""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', ' ', texto.lower()).strip()
+
+
+_APELIDO_PARA_CANONICO = {normalizar_nome(a): canonico for canonico, apelidos in APELIDOS_COLUNAS.items() for a in apelidos}
+
+
+def mapear_colunas(cabecalho):
+    """
+    Mapeia cada célula do cabeçalho para um nome canônico (a primeira ocorrência vence).
+
+    Returns:
+        dict {posição da coluna: nome canônico}
+    """
+    mapa = {}
+    usados = set()
+    for posicao, celula in enumerate(cabecalho):
+        if pd.isna(celula):
+            continue
+        canonico = _APELIDO_PARA_CANONICO.get(normalizar_nome(celula))
+        if canonico and canonico not in usados:
+            mapa[posicao] = canonico
+            usados.add(canonico)
+    return mapa
+
+
+def encontrar_cabecalho(amostra):
+    """
+    Acha a linha de cabeçalho numa amostra lida com header=None (a que mais casa com os apelidos).
+
+    Returns:
+        (índice da linha, {posição: nome canônico})
+    """
+    melhor = (None, {})
+    for indice, linha in enumerate(amostra.itertuples(index=False, name=None)):
+        mapa = mapear_colunas(linha)
+        if len(mapa) > len(melhor[1]):
+            melhor = (indice, mapa)
+
+    indice, mapa = melhor
+    faltando = [c for c in COLUNAS_OBRIGATORIAS if c not in mapa.values()]
+    if indice is None or faltando:
+        raise ArquivoVendasInvalido(
+            f"Layout do relatório de vendas não reconhecido: coluna(s) {faltando or COLUNAS_OBRIGATORIAS} não encontrada(s) "
+            f"nas primeiras {len(amostra)} linhas. Colunas reconhecidas: {list(APELIDOS_COLUNAS)} (ver APELIDOS_COLUNAS)"
+        )
+    return indice, mapa
+
+
+def detectar_formato(amostra_bytes):
+    """Formato real pelo conteúdo (sistemas legados exportam HTML com extensão .xls)"""
+    if amostra_bytes.startswith(b'PK'):
+        return 'xlsx'
+    if amostra_bytes.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'xls'
+    inicio = amostra_bytes[:2048].lstrip().lower()
+    if inicio.startswith((b'<!doctype html', b'<html', b'<table', b'<?xml', b'<meta')) or b'<table' in inicio:
+        return 'html'
+    return 'csv'
+
+
+def decodificar(amostra_bytes, completo=True):
+    """
+    (texto, codificação): UTF-8 (com ou sem BOM), senão cp1252; latin-1 como último recurso.
+
+    Args:
+        completo: False quando os bytes são só o começo do arquivo; um caractere UTF-8
+            cortado no fim da amostra não conta como erro de decodificação
+    """
+    try:
+        return codecs.getincrementaldecoder('utf-8-sig')().decode(amostra_bytes, final=completo), 'utf-8-sig'
+    except UnicodeDecodeError:
+        pass
+    try:
+        return amostra_bytes.decode('cp1252'), 'cp1252'
+    except UnicodeDecodeError:
+        return amostra_bytes.decode('latin-1', errors='replace'), 'latin-1'
+
+
+def detectar_separador(linhas):
+    """
+    Separador que gera o mesmo número de campos (>1) no maior número de linhas.
+    Mais tolerante a preâmbulos do que csv.Sniffer, que exige linhas homogêneas.
+    """
+    melhor, melhor_pontos = ',', (0, 0)
+    for candidato in (';', ',', '\t', '|'):
+        contagens = Counter(len(campos) for campos in csv.reader(linhas, delimiter=candidato) if campos)
+        contagens.pop(1, None)
+        if not contagens:
+            continue
+        campos, linhas_iguais = max(contagens.items(), key=lambda item: (item[1], item[0]))
+        if (linhas_iguais, campos) > melhor_pontos:
+            melhor, melhor_pontos = candidato, (linhas_iguais, campos)
+    return melhor
+
+
+def detectar_decimal(amostra, linha_cabecalho, mapa):
+    """
+    Separador decimal olhando só as células das colunas numéricas abaixo do cabeçalho
+    (nomes de produto como 'COCA 1,5L' não contam).
+
+    Returns:
+        (decimal, milhar): (',', '.') no padrão brasileiro 1.234,56; senão ('.', None)
+    """
+    posicoes = [p for p, canonico in mapa.items() if canonico in COLUNAS_NUMERICAS and p < amostra.shape[1]]
+    celulas = pd.Series(amostra.iloc[linha_cabecalho + 1:, posicoes].to_numpy().ravel()).dropna().astype(str).str.strip()
+    virgula = celulas.str.fullmatch(r'-?[\d.]*\d,\d+').sum()
+    ponto = celulas.str.fullmatch(r'-?\d*\.\d{1,2}').sum()
+    return (',', '.') if virgula > ponto else ('.', None)
+
+
+def converter_numero(serie, decimal='.', milhar=None):
+    """
+    Texto -> float com o separador decimal detectado; '-', vazio e lixo viram NaN.
+    O outro separador só é aceito agrupando milhares (1.234,56 / 1,234.56): '12,50' com
+    decimal '.' é ambíguo e vira NaN, em vez de 1250.
+    """
+    if serie.dtype.kind in 'fi':
+        return serie.astype(float)
+    milhar = milhar or (',' if decimal == '.' else '.')
+    texto = serie.astype(str).str.strip().str.replace(r'[^\d.,\-]', '', regex=True)
+    agrupado = texto.str.fullmatch(rf'-?\d{{1,3}}({re.escape(milhar)}\d{{3}})+({re.escape(decimal)}\d*)?')
+    texto = texto.where(~texto.str.contains(milhar, regex=False) | agrupado)
+    texto = texto.str.replace(milhar, '', regex=False).str.replace(decimal, '.', regex=False)
+    return pd.to_numeric(texto, errors='coerce')
+
+
+def _ler_csv(caminho, amostra_bytes):
+    texto, codificacao = decodificar(amostra_bytes, completo=len(amostra_bytes) < BYTES_AMOSTRA)
+    # Descarta a última linha da amostra (pode ter sido cortada no meio)
+    linhas = texto.splitlines()
+    if len(amostra_bytes) >= BYTES_AMOSTRA:
+        linhas = linhas[:-1]
+    linhas = linhas[:LINHAS_AMOSTRA]
+    separador = detectar_separador(linhas)
+
+    # csv.reader aceita linhas de tamanhos diferentes (preâmbulo antes do cabeçalho)
+    amostra = pd.DataFrame(list(csv.reader(linhas, delimiter=separador)))
+    linha_cabecalho, mapa = encontrar_cabecalho(amostra)
+
+    # Números no padrão brasileiro (1.234,56); com separador ',' eles vêm entre aspas ("12,50")
+    decimal, milhar = detectar_decimal(amostra, linha_cabecalho, mapa)
+
+    argumentos = dict(sep=separador, encoding=codificacao, skiprows=linha_cabecalho + 1, header=None,
+                      usecols=list(mapa), decimal=decimal, thousands=milhar, na_values=VALORES_VAZIOS)
+    tipos = {posicao: ('float64' if canonico in COLUNAS_NUMERICAS else 'string') for posicao, canonico in mapa.items()}
+    try:
+        df = pd.read_csv(caminho, dtype=tipos, **argumentos)
+    except (ValueError, TypeError):
+        # Alguma célula numérica não é número: lê como texto e converte aqui, onde o decimal detectado ainda vale
+        df = pd.read_csv(caminho, dtype=str, **argumentos)
+        for posicao, canonico in mapa.items():
+            if canonico in COLUNAS_NUMERICAS:
+                df[posicao] = converter_numero(df[posicao], decimal, milhar)
+    return _renomear(df, mapa)
+
+
+def _ler_excel(caminho, engine):
+    amostra = pd.read_excel(caminho, sheet_name=0, header=None, nrows=LINHAS_AMOSTRA, engine=engine, dtype=object)
+    linha_cabecalho, mapa = encontrar_cabecalho(amostra)
+    # header=None nas duas leituras para as posições de linha baterem com a amostra
+    df = pd.read_excel(caminho, sheet_name=0, header=None, usecols=list(mapa), engine=engine)
+    return _renomear(df.iloc[linha_cabecalho + 1:].reset_index(drop=True), mapa)
+
+
+def _ler_html(caminho):
+    # `match` descarta já no parse as tabelas que não têm nenhum cabeçalho conhecido
+    padrao = '|'.join(sorted({re.escape(a) for apelidos in APELIDOS_COLUNAS.values() for a in apelidos}, key=len, reverse=True))
+    # Decodifica antes: sem <meta charset> o parser de HTML assume latin-1 e estraga os acentos
+    with open(caminho, 'rb') as arquivo:
+        texto, _ = decodificar(arquivo.read())
+    tabelas = pd.read_html(io.StringIO(texto), decimal=',', thousands='.', header=None, match=f'(?i){padrao}')
+
+    melhor = None
+    for tabela in tabelas:
+        if not isinstance(tabela.columns, pd.RangeIndex):
+            # Cabeçalho em <thead>/<th> vira nome de coluna; volta a ser a primeira linha
+            cabecalho = [c[-1] if isinstance(c, tuple) else c for c in tabela.columns]
+            tabela = pd.concat([pd.DataFrame([cabecalho]), pd.DataFrame(tabela.to_numpy())], ignore_index=True)
+        try:
+            linha_cabecalho, mapa = encontrar_cabecalho(tabela.head(LINHAS_AMOSTRA))
+        except ValueError:
+            continue
+        if melhor is None or len(mapa) > len(melhor[2]):
+            melhor = (tabela, linha_cabecalho, mapa)
+    if melhor is None:
+        raise ArquivoVendasInvalido("Nenhuma tabela de vendas reconhecida no arquivo HTML/.xls")
+
+    tabela, linha_cabecalho, mapa = melhor
+    df = tabela.iloc[linha_cabecalho + 1:, list(mapa)]
+    df.columns = [mapa[p] for p in mapa]
+    return df.reset_index(drop=True)
+
+
+def _renomear(df, mapa):
+    # Com header=None as colunas são as posições originais do arquivo
+    return df.rename(columns=mapa)
+
+
+def ler_relatorio_vendas(caminho):
+    """
+    Lê o relatório de vendas (CSV, XLSX, XLS ou HTML disfarçado de .xls) detectando o layout.
+
+    Returns:
+        DataFrame só com as colunas reconhecidas, já com os nomes canônicos
+
+    Raises:
+        ArquivoVendasInvalido: layout não reconhecido ou arquivo ilegível
+    """
+    with open(caminho, 'rb') as arquivo:
+        amostra_bytes = arquivo.read(BYTES_AMOSTRA)
+
+    formato = detectar_formato(amostra_bytes)
+    print(f"🔎 Layout detectado: {formato.upper()}")
+    try:
+        if formato == 'xlsx':
+            return _ler_excel(caminho, 'openpyxl')
+        if formato == 'xls':
+            return _ler_excel(caminho, 'xlrd')
+        if formato == 'html':
+            return _ler_html(caminho)
+        return _ler_csv(caminho, amostra_bytes)
+    except ArquivoVendasInvalido:
+        raise
+    except (ValueError, zipfile.BadZipFile) as e:
+        # Erros de parse do pandas/openpyxl (arquivo truncado, corrompido, vazio) são do arquivo enviado
+        raise ArquivoVendasInvalido(f"Relatório de vendas ilegível ({formato.upper()}): {e}") from e
@@ -0,0 +1,341 @@
+import calendar
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from calculadora_com_pedaladas import ponto_equilibrio
+
+MESES_PT = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+            'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+
+# z para banda de confiança de 95%
+Z_CONFIANCA = 1.96
+
+# Projeções guardadas por versão do histórico (LRU; o motor vive o processo inteiro)
+TAMANHO_CACHE_PROJECOES = 32
+
+
+def converter_mes_referencia(texto):
+    """'Novembro/2025' -> datetime(2025, 11, 1). Retorna NaT se não reconhecer."""
+    try:
+        mes_nome, ano = str(texto).split('/')
+        return datetime(int(ano), MESES_PT.index(mes_nome.strip()) + 1, 1)
+    except (ValueError, IndexError):
+        return pd.NaT
+
+
+def formatar_mes_referencia(data):
+    return f"{MESES_PT[data.month - 1]}/{data.year}"
+
+
+def ordenar_historico(df_hist):
+    """Adiciona Data_Ordenacao (a partir de Mes_Referencia) e ordena cronologicamente"""
+    df_hist = df_hist.copy()
+    df_hist['Data_Ordenacao'] = pd.to_datetime(df_hist['Mes_Referencia'].map(converter_mes_referencia))
+    return df_hist.dropna(subset=['Data_Ordenacao']).sort_values('Data_Ordenacao').reset_index(drop=True)
+
+
+def versao_historico(df_hist):
+    """Identificador do conteúdo do histórico (muda sempre que uma linha muda)"""
+    return int(pd.util.hash_pandas_object(df_hist, index=False).sum())
+
+
+def resumo_mes_anterior(df_hist, mes_referencia):
+    """
+    Linha do histórico imediatamente anterior a `mes_referencia`, com as chaves do resumo
+    (formato esperado por CalculadoraMargemLucroComPedalada.comparar_mes_anterior)
+    """
+    data_atual = converter_mes_referencia(mes_referencia)
+    if df_hist is None or df_hist.empty or pd.isna(data_atual):
+        return None
+    anteriores = ordenar_historico(df_hist)
+    anteriores = anteriores[anteriores['Data_Ordenacao'] < data_atual]
+    if anteriores.empty:
+        return None
+    linha = anteriores.iloc[-1]
+    return {
+        'receita_bruta_real': linha['Receita_Real'],
+        'lucro_liquido': linha['Lucro_Liquido'],
+        'ticket_medio_real': linha['Ticket_Medio'],
+        'custos_fixos_total': linha['Custos_Fixos'],
+    }
+
+
+# ==========================================
+# MODELOS
+# ==========================================
+
+class ModeloPrevisao:
+    """
+    Base dos modelos: `ajustar(y)` faz o ajuste completo e `atualizar(novos)`
+    incorpora meses novos sem reprocessar a série inteira.
+    Os erros de um passo à frente (resíduos) são acumulados para a banda de confiança.
+    """
+
+    nome = ''
+
+    def __init__(self):
+        self.y = np.array([], dtype=float)
+        self._soma_quadrados = 0.0
+        self._soma_absolutos = 0.0
+        self._n_residuos = 0
+
+    def _registrar_residuos(self, residuos):
+        residuos = np.asarray(residuos, dtype=float)
+        self._soma_quadrados += float(np.sum(residuos ** 2))
+        self._soma_absolutos += float(np.sum(np.abs(residuos)))
+        self._n_residuos += len(residuos)
+
+    @property
+    def desvio(self):
+        return math.sqrt(self._soma_quadrados / self._n_residuos) if self._n_residuos else 0.0
+
+    @property
+    def erro_medio_absoluto(self):
+        return self._soma_absolutos / self._n_residuos if self._n_residuos else math.inf
+
+    def ajustar(self, y):
+        self.__init__(**self._parametros())
+        self.atualizar(y)
+        return self
+
+    def _parametros(self):
+        return {}
+
+    def atualizar(self, novos):
+        raise NotImplementedError
+
+    def prever(self, horizonte):
+        """Retorna (media, desvio) para os próximos `horizonte` meses"""
+        raise NotImplementedError
+
+
+class NaiveSazonal(ModeloPrevisao):
+    """Repete o valor do mesmo mês no ciclo anterior (ou o último valor, sem ciclo completo)"""
+
+    nome = 'Naive Sazonal'
+
+    def __init__(self, periodo=12):
+        super().__init__()
+        self.periodo = periodo
+
+    def _parametros(self):
+        return {'periodo': self.periodo}
+
+    def _defasagem(self, n):
+        return self.periodo if n > self.periodo else 1
+
+    def atualizar(self, novos):
+        novos = np.asarray(novos, dtype=float)
+        y = np.concatenate([self.y, novos])
+        inicio = len(self.y)
+        lag = self._defasagem(len(y))
+        # Resíduos dos pontos novos; se a defasagem mudou (completou o ciclo), recomeça
+        if lag != self._defasagem(inicio):
+            self.__init__(self.periodo)
+            inicio = 0
+        posicoes = np.arange(max(inicio, lag), len(y))
+        self._registrar_residuos(y[posicoes] - y[posicoes - lag])
+        self.y = y
+        return self
+
+    def prever(self, horizonte):
+        lag = self._defasagem(len(self.y))
+        passos = np.arange(horizonte)
+        media = self.y[len(self.y) - lag + (passos % lag)]
+        desvio = self.desvio * np.sqrt(passos // lag + 1)
+        return media, desvio
+
+
+class MediaMovel(ModeloPrevisao):
+    """Média dos últimos `janela` meses"""
+
+    nome = 'Média Móvel'
+
+    def __init__(self, janela=3):
+        super().__init__()
+        self.janela = janela
+
+    def _parametros(self):
+        return {'janela': self.janela}
+
+    def atualizar(self, novos):
+        novos = np.asarray(novos, dtype=float)
+        y = np.concatenate([self.y, novos])
+        inicio = max(len(self.y), 1)
+        if len(y) > inicio:
+            acumulada = np.concatenate([[0.0], np.cumsum(y)])
+            posicoes = np.arange(inicio, len(y))
+            inicio_janela = np.maximum(posicoes - self.janela, 0)
+            medias = (acumulada[posicoes] - acumulada[inicio_janela]) / (posicoes - inicio_janela)
+            self._registrar_residuos(y[posicoes] - medias)
+        self.y = y
+        return self
+
+    def prever(self, horizonte):
+        media = np.full(horizonte, self.y[-self.janela:].mean())
+        desvio = self.desvio * np.sqrt(np.arange(1, horizonte + 1))
+        return media, desvio
+
+
+class SuavizacaoExponencial(ModeloPrevisao):
+    """Suavização exponencial simples; alpha escolhido por busca em grade (todas de uma vez)"""
+
+    nome = 'Suavização Exponencial'
+    ALPHAS = np.linspace(0.05, 1.0, 20)
+
+    def __init__(self, alpha=None):
+        super().__init__()
+        self.alpha = alpha
+        self.nivel = None
+
+    def ajustar(self, y):
+        y = np.asarray(y, dtype=float)
+        self.__init__()
+        if len(y) >= 3:
+            # Roda o filtro para todos os alphas em paralelo e fica com o de menor SSE
+            alphas = self.ALPHAS
+            nivel = np.full(len(alphas), y[0])
+            sse = np.zeros(len(alphas))
+            for valor in y[1:]:
+                erro = valor - nivel
+                sse += erro ** 2
+                nivel = nivel + alphas * erro
+            self.alpha = float(alphas[np.argmin(sse)])
+        else:
+            self.alpha = 0.5
+        return self.atualizar(y)
+
+    def atualizar(self, novos):
+        novos = np.asarray(novos, dtype=float)
+        if self.alpha is None:
+            return self.ajustar(novos)
+        residuos = []
+        for valor in novos:
+            if self.nivel is None:
+                self.nivel = valor
+                continue
+            erro = valor - self.nivel
+            residuos.append(erro)
+            self.nivel += self.alpha * erro
+        self._registrar_residuos(residuos)
+        self.y = np.concatenate([self.y, novos])
+        return self
+
+    def prever(self, horizonte):
+        media = np.full(horizonte, self.nivel)
+        desvio = self.desvio * np.sqrt(1 + np.arange(horizonte) * self.alpha ** 2)
+        return media, desvio
+
+
+def _criar_modelos():
+    return [NaiveSazonal(), MediaMovel(), SuavizacaoExponencial()]
+
+
+# ==========================================
+# MOTOR DE PROJEÇÃO
+# ==========================================
+
+class MotorPrevisao:
+    """
+    Projeta receita, lucro e ponto de equilíbrio dos próximos meses a partir do histórico.
+
+    - As projeções ficam em cache (LRU, TAMANHO_CACHE_PROJECOES) pela versão (hash) do histórico.
+    - Quando o histórico novo é o antigo + meses no final (caso de "Salvar no Histórico"),
+      os modelos são atualizados incrementalmente em vez de reajustados.
+    """
+
+    # chave -> (coluna do histórico, coluna projetada)
+    SERIES = {'receita': ('Receita_Real', 'Receita_Prevista'), 'lucro': ('Lucro_Liquido', 'Lucro_Previsto')}
+
+    def __init__(self, horizonte=3, janela_contribuicao=3, tamanho_cache=TAMANHO_CACHE_PROJECOES):
+        self.horizonte = horizonte
+        self.janela_contribuicao = janela_contribuicao
+        self.tamanho_cache = tamanho_cache
+        self._projecoes = OrderedDict()
+        self._modelos = {}
+        self._lock = threading.Lock()  # o motor é compartilhado entre sessões do Streamlit
+
+    def _modelos_para(self, chave, y):
+        """Reaproveita os modelos já ajustados se `y` só acrescenta meses ao final"""
+        anterior = self._modelos.get(chave)
+        if anterior is not None:
+            y_anterior, modelos = anterior
+            n = len(y_anterior)
+            if len(y) > n and np.array_equal(y[:n], y_anterior):
+                for modelo in modelos:
+                    modelo.atualizar(y[n:])
+                self._modelos[chave] = (y.copy(), modelos)
+                return modelos
+            if np.array_equal(y, y_anterior):
+                return modelos
+
+        modelos = [modelo.ajustar(y) for modelo in _criar_modelos()]
+        self._modelos[chave] = (y.copy(), modelos)
+        return modelos
+
+    @staticmethod
+    def _melhor(modelos):
+        return min(modelos, key=lambda m: m.erro_medio_absoluto)
+
+    def projetar(self, df_hist):
+        """
+        Returns:
+            DataFrame com uma linha por mês projetado (vazio se houver menos de 2 meses)
+        """
+        with self._lock:
+            return self._projetar(ordenar_historico(df_hist))
+
+    def _projetar(self, df_hist):
+        versao = (versao_historico(df_hist), self.horizonte)
+        if versao in self._projecoes:
+            self._projecoes.move_to_end(versao)
+            return self._projecoes[versao]
+
+        if len(df_hist) < 2:
+            return pd.DataFrame()
+
+        projecao = pd.DataFrame({
+            'Data': [df_hist['Data_Ordenacao'].iloc[-1] + pd.DateOffset(months=i) for i in range(1, self.horizonte + 1)]
+        })
+        projecao['Mes_Referencia'] = projecao['Data'].map(formatar_mes_referencia)
+
+        for chave, (coluna, coluna_prevista) in self.SERIES.items():
+            y = df_hist[coluna].to_numpy(dtype=float)
+            modelo = self._melhor(self._modelos_para(chave, y))
+            media, desvio = modelo.prever(self.horizonte)
+            rotulo = coluna.split('_')[0]
+            projecao[coluna_prevista] = media
+            projecao[f'{rotulo}_Min'] = media - Z_CONFIANCA * desvio
+            projecao[f'{rotulo}_Max'] = media + Z_CONFIANCA * desvio
+            projecao[f'Modelo_{rotulo}'] = modelo.nome
+
+        # Ponto de equilíbrio com a mesma definição do kpi_break_even da calculadora, sobre a
+        # margem bruta dos meses recentes. Linhas antigas, sem Margem_Bruta, aproximam por
+        # lucro + fixos (o recálculo do histórico preenche a coluna)
+        recentes = df_hist.tail(self.janela_contribuicao)
+        margem = recentes['Lucro_Liquido'] + recentes['Custos_Fixos']
+        if 'Margem_Bruta' in recentes.columns:
+            margem = recentes['Margem_Bruta'].fillna(margem)
+        break_even = ponto_equilibrio(df_hist['Custos_Fixos'].iloc[-1], margem.sum(), recentes['Receita_Real'].sum())
+        break_even = break_even if break_even > 0 else np.nan
+        projecao['Break_Even'] = break_even
+
+        # Data em que a receita projetada (vendas lineares no mês) cobre o break-even
+        dias_mes = projecao['Data'].map(lambda d: calendar.monthrange(d.year, d.month)[1])
+        receita = projecao['Receita_Prevista'].where(projecao['Receita_Prevista'] > 0)
+        dia = np.ceil(break_even / receita * dias_mes)
+        atingido = dia.le(dias_mes) & dia.notna()
+        projecao['Data_Break_Even'] = [
+            d.replace(day=max(1, int(n))) if ok else pd.NaT
+            for d, n, ok in zip(projecao['Data'], dia.fillna(0), atingido)
+        ]
+
+        self._projecoes[versao] = projecao
+        while len(self._projecoes) > self.tamanho_cache:
+            self._projecoes.popitem(last=False)
+        return projecao
@@ -0,0 +1,107 @@
+"""
+Classificação automática de itens que não são receita (pedaladas, consumo interno, testes...).
+
+Cada linha da tabela de regras (Regras_Pedalada.csv) tem:
+    Regra         Nome do grupo (aparece no resumo)
+    Padrao        Texto procurado no nome do Produto (sem diferenciar maiúsculas)
+    Tratamento    pedalada    -> sai da receita e do crédito; taxas do cartão continuam sendo pagas
+                  nao_receita -> sai da receita; taxas e custo de insumos continuam (refeição de funcionário, cortesia)
+                  ignorar     -> sai da receita sem taxas nem custo (testes, transferências internas)
+    Valor_Minimo  (opcional) só classifica se Valor >= mínimo
+    Valor_Maximo  (opcional) só classifica se Valor <= máximo
+
+Várias linhas podem ter a mesma Regra (um padrão por linha). A primeira linha que casa vence.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+TRATAMENTOS = ('pedalada', 'nao_receita', 'ignorar')
+
+COLUNAS_REGRAS = ['Regra', 'Padrao', 'Tratamento', 'Valor_Minimo', 'Valor_Maximo']
+
+REGRAS_PADRAO = pd.DataFrame([
+    {'Regra': 'Produção Cozinha Industrial', 'Padrao': 'Produção Cozinha Industrial', 'Tratamento': 'pedalada',
+     'Valor_Minimo': np.nan, 'Valor_Maximo': np.nan},
+], columns=COLUNAS_REGRAS)
+
+
+class ClassificadorNaoReceita:
+    """
+    Monta a matriz (linhas x regras) com um `str.contains` literal e vetorizado por padrão
+    distinto, sobre a coluna Produto já em minúsculas; a primeira regra que casa vence.
+    Sem laço em Python por linha.
+    """
+
+    def __init__(self, regras_df):
+        regras = regras_df.reindex(columns=COLUNAS_REGRAS).copy()
+        regras = regras.dropna(subset=['Padrao'])
+        regras['Padrao'] = regras['Padrao'].astype(str).str.strip()
+        regras = regras[regras['Padrao'] != ''].reset_index(drop=True)
+        regras['Regra'] = regras['Regra'].fillna(regras['Padrao']).astype(str)
+        regras['Tratamento'] = regras['Tratamento'].fillna('pedalada').astype(str).str.strip().str.lower()
+
+        invalidos = set(regras['Tratamento']) - set(TRATAMENTOS)
+        if invalidos:
+            raise ValueError(f"Tratamento(s) desconhecido(s) nas regras de pedalada: {sorted(invalidos)}. Use {TRATAMENTOS}")
+
+        # O resumo agrega por Regra: a mesma Regra com dois tratamentos somaria valores de naturezas diferentes
+        tratamentos_por_regra = regras.groupby('Regra')['Tratamento'].nunique()
+        ambiguas = tratamentos_por_regra[tratamentos_por_regra > 1].index.tolist()
+        if ambiguas:
+            raise ValueError(f"Regra(s) com mais de um tratamento nas regras de pedalada: {ambiguas}. "
+                             f"Use um nome de Regra por tratamento")
+
+        regras['Valor_Minimo'] = pd.to_numeric(regras['Valor_Minimo'], errors='coerce').fillna(-np.inf)
+        regras['Valor_Maximo'] = pd.to_numeric(regras['Valor_Maximo'], errors='coerce').fillna(np.inf)
+        self.regras = regras
+
+        # Padrões repetidos entre regras (ex: faixas de valor diferentes) são procurados uma vez só
+        padroes = regras['Padrao'].str.lower()
+        self.padroes = list(dict.fromkeys(padroes))
+        self.coluna_padrao = padroes.map({p: i for i, p in enumerate(self.padroes)}).to_numpy(dtype=int)
+
+    @classmethod
+    def de_arquivo(cls, caminho):
+        if caminho and os.path.exists(caminho):
+            return cls(pd.read_csv(caminho))
+        return cls(REGRAS_PADRAO)
+
+    def classificar(self, vendas):
+        """
+        Returns:
+            DataFrame alinhado a `vendas` com colunas Regra e Tratamento (NaN onde nenhuma regra casou)
+        """
+        saida = pd.DataFrame({'Regra': np.nan, 'Tratamento': np.nan}, index=vendas.index, dtype=object)
+        if self.regras.empty or vendas.empty:
+            return saida
+
+        # Matriz (linhas x regras): casou o texto E está dentro dos limites de valor
+        produtos = vendas['Produto'].astype(str).str.lower()
+        por_padrao = np.column_stack([produtos.str.contains(p, regex=False).to_numpy(dtype=bool) for p in self.padroes])
+        casou = por_padrao[:, self.coluna_padrao]
+        valor = vendas['Valor'].to_numpy(dtype=float)[:, None]
+        dentro = (valor >= self.regras['Valor_Minimo'].to_numpy()) & (valor <= self.regras['Valor_Maximo'].to_numpy())
+        aplica = casou & dentro
+
+        tem_regra = aplica.any(axis=1)
+        primeira = aplica.argmax(axis=1)[tem_regra]
+        saida.loc[tem_regra, 'Regra'] = self.regras['Regra'].to_numpy()[primeira]
+        saida.loc[tem_regra, 'Tratamento'] = self.regras['Tratamento'].to_numpy()[primeira]
+        return saida
+
+
+_cache_classificadores = {}
+_lock_cache = threading.Lock()
+
+
+def carregar_classificador(caminho):
+    """Classificador compilado, reaproveitado enquanto o arquivo de regras não mudar"""
+    chave = (caminho, os.path.getmtime(caminho) if caminho and os.path.exists(caminho) else None)
+    with _lock_cache:
+        if chave not in _cache_classificadores:
+            _cache_classificadores[chave] = ClassificadorNaoReceita.de_arquivo(caminho)
+        return _cache_classificadores[chave]
@@ -0,0 +1,370 @@
+"""
+Regressão da matemática financeira da calculadora: arquivos golden + propriedades.
+
+Golden: para cada caso de dados_regressao/casos.json o `resumo` completo e a tabela
+por produto ficam gravados em dados_regressao/golden/. Qualquer reescrita
+(vetorizada, com cache, paralela) precisa reproduzir esses valores.
+
+Propriedades: vendas aleatórias (Hypothesis, se instalado; senão sementes fixas do NumPy)
+conferem invariantes que valem para qualquer relatório, como
+lucro = receita real - insumos - fixos - taxas e taxas monotônicas nos valores pagos.
+
+Uso:
+    python regressao.py                        # confere golden e propriedades
+    python regressao.py --atualizar            # regrava os golden (só depois de revisar a diferença!)
+    python regressao.py --exemplos 500         # mais exemplos por propriedade
+    python regressao.py --calculadora modulo:Classe   # confere outra implementação contra a referência
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from calculadora_com_pedaladas import TAXAS_PAGAMENTO_PADRAO, CalculadoraMargemLucroComPedalada
+from exportador import _valor_json, achatar_resumo, exportar_arquivo
+
+DIRETORIO_DADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dados_regressao')
+DIRETORIO_GOLDEN = os.path.join(DIRETORIO_DADOS, 'golden')
+
+# Chaves que mudam a cada execução e não entram na comparação
+CHAVES_VOLATEIS = ('data_processamento',)
+
+# Folga para reescritas que somam em outra ordem (ponto flutuante)
+TOLERANCIA_RELATIVA = 1e-9
+TOLERANCIA_ABSOLUTA = 1e-6
+
+EXEMPLOS_PADRAO = 50
+
+FORMAS_PAGAMENTO = ['Cashless', 'Débito', 'Crédito', 'Dinheiro', 'Voucher', 'Divisão', 'Outros']
+CATEGORIAS = ['BEBIDAS', 'PRATOS', 'SOBREMESAS', 'SALGADOS']
+# Nomes que casam com as regras de dados_regressao/Regras_Pedalada.csv
+ITENS_NAO_RECEITA = ['Produção Cozinha Industrial', 'Consumo Funcionário', 'Cortesia Mesa 4',
+                     'Transferência Interna', 'Teste Sistema']
+
+
+def calculadora_referencia(**kwargs):
+    """Calculadora com os custos e regras congelados do corpus de regressão"""
+    return CalculadoraMargemLucroComPedalada(
+        os.path.join(DIRETORIO_DADOS, 'Variaveis.csv'),
+        os.path.join(DIRETORIO_DADOS, 'Fixos.csv'),
+        os.path.join(DIRETORIO_DADOS, 'Regras_Pedalada.csv'),
+        **kwargs
+    )
+
+
+def carregar_casos():
+    with open(os.path.join(DIRETORIO_DADOS, 'casos.json'), encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _processar(fabrica, arquivo_vendas, mes_referencia=None, valor_pedaladas=0, taxas_pagamento=None):
+    calc = fabrica(taxas_pagamento=taxas_pagamento)
+    # O relatório impresso no console não interessa aqui (nem os avisos de divisão por zero dele)
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(divide='ignore', invalid='ignore'):
+        return calc.processar_relatorio_mensal(arquivo_vendas, mes_referencia, valor_pedaladas, salvar_resultado=False)
+
+
+def executar_caso(caso, fabrica=calculadora_referencia):
+    return _processar(fabrica, os.path.join(DIRETORIO_DADOS, caso['vendas']), caso.get('mes_referencia'),
+                      caso.get('valor_pedaladas', 0), caso.get('taxas_pagamento'))
+
+
+# --- Golden ---
+
+def _caminhos_golden(nome):
+    return (os.path.join(DIRETORIO_GOLDEN, f"{nome}.resumo.json"),
+            os.path.join(DIRETORIO_GOLDEN, f"{nome}.produtos.csv"))
+
+
+def _resumo_estavel(resumo):
+    return {k: v for k, v in _valor_json(resumo).items() if k not in CHAVES_VOLATEIS}
+
+
+def gravar_golden(caso, fabrica=calculadora_referencia):
+    resumo, resultado = executar_caso(caso, fabrica)
+    caminho_resumo, caminho_produtos = _caminhos_golden(caso['nome'])
+    os.makedirs(DIRETORIO_GOLDEN, exist_ok=True)
+    with open(caminho_resumo, 'w', encoding='utf-8') as arquivo:
+        json.dump(_resumo_estavel(resumo), arquivo, ensure_ascii=False, indent=2, sort_keys=True)
+        arquivo.write('\n')
+    exportar_arquivo(resultado, resumo, caminho_produtos, formato='csv')
+
+
+def _iguais(esperado, obtido):
+    if isinstance(esperado, (int, float)) and isinstance(obtido, (int, float, np.number)) \
+            and not isinstance(esperado, bool):
+        if math.isnan(esperado) and math.isnan(float(obtido)):
+            return True
+        return math.isclose(esperado, float(obtido), rel_tol=TOLERANCIA_RELATIVA, abs_tol=TOLERANCIA_ABSOLUTA)
+    return esperado == obtido
+
+
+def comparar_resumo(esperado, obtido):
+    """Lista de diferenças (chave achatada, esperado, obtido) entre dois resumos"""
+    esperado = dict(achatar_resumo(esperado))
+    obtido = dict(achatar_resumo(_resumo_estavel(obtido)))
+    diferencas = []
+    for chave in sorted(set(esperado) | set(obtido)):
+        if chave not in obtido or chave not in esperado or not _iguais(esperado[chave], obtido[chave]):
+            diferencas.append((chave, esperado.get(chave, '<ausente>'), obtido.get(chave, '<ausente>')))
+    return diferencas
+
+
+def comparar_produtos(esperado, obtido):
+    """Lista de diferenças entre a tabela por produto gravada e a obtida (colunas, ordem e valores)"""
+    if list(esperado.columns) != list(obtido.columns):
+        return [('colunas', list(esperado.columns), list(obtido.columns))]
+    if len(esperado) != len(obtido):
+        return [('linhas', len(esperado), len(obtido))]
+
+    diferencas = []
+    for coluna in esperado.columns:
+        a, b = esperado[coluna], obtido[coluna].reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            ok = np.isclose(a.to_numpy(dtype=float), b.to_numpy(dtype=float),
+                            rtol=TOLERANCIA_RELATIVA, atol=TOLERANCIA_ABSOLUTA, equal_nan=True)
+        else:
+            ok = (a.astype(str).fillna('') == b.astype(str).fillna('')).to_numpy()
+        for linha in np.flatnonzero(~ok)[:5]:
+            diferencas.append((f"{coluna}[{linha}]", a.iloc[linha], b.iloc[linha]))
+    return diferencas
+
+
+def verificar_golden(casos, fabrica=calculadora_referencia):
+    """Roda cada caso e compara com o golden. Retorna {nome do caso: lista de diferenças}"""
+    falhas = {}
+    for caso in casos:
+        caminho_resumo, caminho_produtos = _caminhos_golden(caso['nome'])
+        if not os.path.exists(caminho_resumo) or not os.path.exists(caminho_produtos):
+            falhas[caso['nome']] = [('golden', 'ausente', 'rode com --atualizar')]
+            continue
+        with open(caminho_resumo, encoding='utf-8') as arquivo:
+            esperado_resumo = json.load(arquivo)
+        esperado_produtos = pd.read_csv(caminho_produtos, keep_default_na=False, na_values=[''])
+
+        resumo, resultado = executar_caso(caso, fabrica)
+        diferencas = comparar_resumo(esperado_resumo, resumo) + comparar_produtos(esperado_produtos, resultado)
+        if diferencas:
+            falhas[caso['nome']] = diferencas
+    return falhas
+
+
+# --- Propriedades ---
+
+def gerar_vendas(rng, produtos_com_custo):
+    """Relatório de vendas aleatório: produtos com e sem custo, zeros, e às vezes itens não-receita"""
+    n = int(rng.integers(1, 40))
+    nomes = list(rng.choice(produtos_com_custo, size=min(n, len(produtos_com_custo)), replace=False))
+    nomes += [f"PRODUTO NOVO {i}" for i in range(int(rng.integers(0, 4)))]
+    if rng.random() < 0.5:
+        nomes += list(rng.choice(ITENS_NAO_RECEITA, size=int(rng.integers(1, 3)), replace=False))
+
+    pagamentos = rng.uniform(0, 500, size=(len(nomes), len(FORMAS_PAGAMENTO))).round(2)
+    pagamentos[rng.random(pagamentos.shape) < 0.4] = 0.0
+    vendas = pd.DataFrame(pagamentos, columns=FORMAS_PAGAMENTO)
+    vendas.insert(0, 'Quantidade', rng.integers(0, 120, size=len(nomes)).astype(float))
+    vendas.insert(0, 'Produto', nomes)
+    vendas.insert(0, 'Categoria', rng.choice(CATEGORIAS, size=len(nomes)))
+    vendas['Desconto'] = 0.0
+    vendas['Valor'] = vendas[FORMAS_PAGAMENTO].sum(axis=1).round(2)
+    return vendas
+
+
+def _processar_vendas(fabrica, vendas, valor_pedaladas=0, taxas_pagamento=None):
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'vendas.csv')
+        vendas.to_csv(caminho, index=False)
+        return _processar(fabrica, caminho, 'Janeiro/2025', valor_pedaladas, taxas_pagamento)
+
+
+def _perto(a, b):
+    return math.isclose(a, b, rel_tol=TOLERANCIA_RELATIVA, abs_tol=TOLERANCIA_ABSOLUTA)
+
+
+def propriedade_identidade_lucro(rng, fabrica, produtos):
+    """lucro = receita real - insumos - fixos - taxas; aliases iguais; taxas do resumo = soma por produto"""
+    vendas = gerar_vendas(rng, produtos)
+    resumo, resultado = _processar_vendas(fabrica, vendas, valor_pedaladas=float(rng.choice([0, rng.uniform(0, 300)])))
+
+    lucro = resumo['receita_bruta_real'] - resumo['custo_insumos_total'] - resumo['custos_fixos_total'] - resumo['taxa_total_geral']
+    assert _perto(resumo['lucro_liquido'], lucro), f"lucro {resumo['lucro_liquido']} != {lucro}"
+    assert resumo['lucro_liquido_estimado'] == resumo['lucro_liquido'], "alias lucro_liquido_estimado divergiu"
+    assert resumo['margem_liquida_percentual'] == resumo['percentual_margem_liquida'], "alias margem_liquida_percentual divergiu"
+    assert _perto(resumo['custos_variaveis_totais'], resumo['custo_insumos_total']), "fallback de custos_variaveis_totais divergiu"
+
+    taxas_produtos = resultado['Taxa_Total_Produto'].sum() + resumo['taxa_variavel_pedalada_auto']
+    assert _perto(resumo['taxa_total_geral'], taxas_produtos), f"taxa_total_geral {resumo['taxa_total_geral']} != {taxas_produtos}"
+
+
+def propriedade_receita(rng, fabrica, produtos):
+    """Toda venda do relatório fica na receita do sistema; a real desconta pedaladas e itens não-receita"""
+    vendas = gerar_vendas(rng, produtos)
+    pedaladas = float(rng.uniform(0, 300))
+    resumo, _ = _processar_vendas(fabrica, vendas, valor_pedaladas=pedaladas)
+
+    assert _perto(resumo['receita_bruta_sistema'], vendas['Valor'].sum()), "receita do sistema não bate com o relatório"
+    real = resumo['receita_bruta_sistema'] - resumo['valor_pedaladas'] - resumo['valor_excluido_auto']
+    assert _perto(resumo['receita_bruta_real'], real), "receita real não bate com sistema - pedaladas - excluídos"
+    assert _perto(resumo['valor_pedaladas'], pedaladas + resumo['valor_pedalada_auto']), "pedaladas manual + auto divergiram"
+
+
+def propriedade_taxas_monotonicas(rng, fabrica, produtos):
+    """Pagar mais numa forma de pagamento nunca reduz taxas; em dinheiro não muda nada"""
+    vendas = gerar_vendas(rng, produtos)
+    resumo_antes, _ = _processar_vendas(fabrica, vendas)
+
+    linha = int(rng.integers(0, len(vendas)))
+    forma = str(rng.choice(FORMAS_PAGAMENTO))
+    acrescimo = round(float(rng.uniform(0.01, 1000)), 2)
+    vendas.loc[linha, forma] += acrescimo
+    vendas.loc[linha, 'Valor'] += acrescimo
+    resumo_depois, _ = _processar_vendas(fabrica, vendas)
+
+    antes, depois = resumo_antes['taxa_total_geral'], resumo_depois['taxa_total_geral']
+    if forma == 'Dinheiro':
+        assert _perto(antes, depois), f"taxa mudou com pagamento em dinheiro: {antes} -> {depois}"
+    else:
+        assert depois >= antes - TOLERANCIA_ABSOLUTA, f"taxa caiu ao pagar +{acrescimo} em {forma}: {antes} -> {depois}"
+
+    # Taxa percentual maior também nunca reduz o total
+    forma_taxa = str(rng.choice(list(TAXAS_PAGAMENTO_PADRAO)))
+    taxas = {forma_taxa: TAXAS_PAGAMENTO_PADRAO[forma_taxa] + float(rng.uniform(0, 0.05))}
+    resumo_taxa, _ = _processar_vendas(fabrica, vendas, taxas_pagamento=taxas)
+    assert resumo_taxa['taxa_total_geral'] >= depois - TOLERANCIA_ABSOLUTA, f"taxa caiu ao aumentar a taxa de {forma_taxa}"
+
+
+def propriedade_guardas_valor_zero(rng, fabrica, produtos):
+    """Produto com Valor zero tem margem e percentual zerados (sem divisão por zero)"""
+    vendas = gerar_vendas(rng, produtos)
+    zerados = rng.random(len(vendas)) < 0.3
+    vendas.loc[zerados, FORMAS_PAGAMENTO + ['Valor']] = 0.0
+    _, resultado = _processar_vendas(fabrica, vendas)
+
+    sem_valor = resultado['Valor'] == 0
+    assert (resultado.loc[sem_valor, 'Margem_Unitaria'] == 0).all(), "Margem_Unitaria != 0 com Valor zero"
+    assert (resultado.loc[sem_valor, 'Percentual_Margem_Produto'] == 0).all(), "Percentual_Margem_Produto != 0 com Valor zero"
+    com_quantidade = resultado['Quantidade'] > 0
+    assert np.isfinite(resultado.loc[com_quantidade, 'Margem_Unitaria']).all(), "Margem_Unitaria não finita"
+
+
+def propriedade_ordem_linhas(rng, fabrica, produtos):
+    """O resumo não depende da ordem das linhas do relatório (pré-requisito para processar em paralelo)"""
+    vendas = gerar_vendas(rng, produtos)
+    resumo, _ = _processar_vendas(fabrica, vendas)
+    embaralhado = vendas.sample(frac=1, random_state=int(rng.integers(0, 2 ** 31))).reset_index(drop=True)
+    resumo_embaralhado, _ = _processar_vendas(fabrica, embaralhado)
+    diferencas = comparar_resumo(_resumo_estavel(resumo), resumo_embaralhado)
+    assert not diferencas, f"resumo mudou com a ordem das linhas: {diferencas[:3]}"
+
+
+PROPRIEDADES = [
+    propriedade_identidade_lucro,
+    propriedade_receita,
+    propriedade_taxas_monotonicas,
+    propriedade_guardas_valor_zero,
+    propriedade_ordem_linhas,
+]
+
+
+def verificar_propriedades(exemplos=EXEMPLOS_PADRAO, semente=0, fabrica=calculadora_referencia):
+    """
+    Roda cada propriedade sobre `exemplos` relatórios aleatórios.
+    Com Hypothesis instalado a semente do gerador é sorteada (e reduzida na falha) por ele;
+    sem Hypothesis usa as sementes semente..semente+exemplos, reproduzíveis.
+
+    Returns:
+        {nome da propriedade: mensagem da falha}
+    """
+    produtos = pd.read_csv(os.path.join(DIRETORIO_DADOS, 'Variaveis.csv'))['Produto'].tolist()
+    falhas = {}
+    try:
+        from hypothesis import given, settings, strategies as st
+    except ImportError:
+        given = None
+
+    for propriedade in PROPRIEDADES:
+        if given is not None:
+            @settings(max_examples=exemplos, deadline=None)
+            @given(st.integers(min_value=0, max_value=2 ** 32 - 1))
+            def executar(semente_exemplo):
+                propriedade(np.random.default_rng(semente_exemplo), fabrica, produtos)
+            try:
+                executar()
+            except AssertionError as erro:
+                falhas[propriedade.__name__] = str(erro)
+            continue
+
+        for semente_exemplo in range(semente, semente + exemplos):
+            try:
+                propriedade(np.random.default_rng(semente_exemplo), fabrica, produtos)
+            except AssertionError as erro:
+                falhas[propriedade.__name__] = f"semente {semente_exemplo}: {erro}"
+                break
+    return falhas
+
+
+def _importar_calculadora(alvo):
+    """'modulo:Classe' -> fábrica com os mesmos arquivos de custo da referência"""
+    modulo, _, classe = alvo.partition(':')
+    cls = getattr(importlib.import_module(modulo), classe or 'CalculadoraMargemLucroComPedalada')
+
+    def fabrica(**kwargs):
+        return cls(os.path.join(DIRETORIO_DADOS, 'Variaveis.csv'), os.path.join(DIRETORIO_DADOS, 'Fixos.csv'),
+                   os.path.join(DIRETORIO_DADOS, 'Regras_Pedalada.csv'), **kwargs)
+    return fabrica
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regressão da matemática financeira (golden + propriedades)")
+    parser.add_argument('--atualizar', action='store_true', help="regrava os arquivos golden com a implementação atual")
+    parser.add_argument('--exemplos', type=int, default=EXEMPLOS_PADRAO, help="exemplos por propriedade")
+    parser.add_argument('--semente', type=int, default=0, help="primeira semente (sem Hypothesis)")
+    parser.add_argument('--calculadora', help="implementação alternativa a conferir, no formato modulo:Classe")
+    parser.add_argument('--sem-propriedades', action='store_true', help="confere só os golden")
+    args = parser.parse_args(argv)
+
+    fabrica = _importar_calculadora(args.calculadora) if args.calculadora else calculadora_referencia
+    casos = carregar_casos()
+
+    if args.atualizar:
+        for caso in casos:
+            gravar_golden(caso, fabrica)
+            print(f"💾 Golden regravado: {caso['nome']}")
+        return 0
+
+    ok = True
+    falhas_golden = verificar_golden(casos, fabrica)
+    for caso in casos:
+        diferencas = falhas_golden.get(caso['nome'])
+        if not diferencas:
+            print(f"✅ Golden: {caso['nome']}")
+            continue
+        ok = False
+        print(f"❌ Golden: {caso['nome']} ({len(diferencas)} diferença(s))")
+        for chave, esperado, obtido in diferencas[:10]:
+            print(f"   - {chave}: esperado {esperado!r}, obtido {obtido!r}")
+
+    if not args.sem_propriedades:
+        falhas = verificar_propriedades(args.exemplos, args.semente, fabrica)
+        for propriedade in PROPRIEDADES:
+            nome = propriedade.__name__
+            if nome in falhas:
+                ok = False
+                print(f"❌ Propriedade: {nome}\n   {falhas[nome]}")
+            else:
+                print(f"✅ Propriedade: {nome} ({args.exemplos} exemplos)")
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import math
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from analytics_produtos import calcular_analytics
+from anomalias import detectar_anomalias_vendas
+
+# Colunas exibidas no detalhamento (o resto fica só no servidor)
+COLUNAS_DETALHE = ['Categoria', 'Produto', 'Quantidade', 'Valor',
+                   'Custo_Insumo_Unitario', 'Custo_Total_Insumos',
+                   'Taxa_Total_Produto', 'Receita_Liquida_Produto',
+                   'Margem_Unitaria', 'Percentual_Margem_Produto']
+
+
+class ResultadoDashboard:
+    """
+    Envolve (resumo, df_resultado) e guarda os agregados prontos para os gráficos,
+    calculados uma única vez por processamento e reaproveitados a cada rerun.
+    """
+
+    def __init__(self, resumo, df_resultado, mes=None):
+        self.resumo = resumo
+        self.df = df_resultado
+        self.mes = mes
+        self._memo = {}
+
+    def memo(self, chave, fabrica):
+        """Retorna o objeto guardado em `chave`, criando com `fabrica()` na primeira vez (ex: figuras Plotly)"""
+        if chave not in self._memo:
+            self._memo[chave] = fabrica()
+        return self._memo[chave]
+
+    def obter_memo(self, chave, padrao=None):
+        """Retorna o objeto guardado em `chave` sem criá-lo"""
+        return self._memo.get(chave, padrao)
+
+    # --- AGREGADOS PARA GRÁFICOS ---
+
+    @cached_property
+    def dados_donut(self):
+        """Composição de custos vs lucro (rótulos, valores)"""
+        labels = ['Custos Variáveis', 'Custos Fixos', 'Taxas', 'Lucro Líquido']
+        values = [
+            self.resumo.get('custos_variaveis_totais', 0),
+            self.resumo.get('custos_fixos_total', 0),
+            self.resumo.get('taxa_total_geral', 0),
+            self.resumo.get('lucro_liquido_estimado', 0)
+        ]
+        return labels, values
+
+    def top_produtos(self, n=5, coluna='Receita_Liquida_Produto'):
+        """Top N produtos por `coluna`, apenas com as colunas usadas no gráfico"""
+        return self.memo(('top', n, coluna),
+                         lambda: self.df.nlargest(n, coluna)[['Produto', coluna]].reset_index(drop=True))
+
+    @cached_property
+    def analytics(self):
+        """ABC/Pareto, engenharia de cardápio e consolidação por categoria (ver analytics_produtos)"""
+        return calcular_analytics(self.df)
+
+    @property
+    def resumo_categorias(self):
+        """Totais por Categoria (uma linha por categoria), ordenado por receita líquida"""
+        return self.analytics['categorias']
+
+    def anomalias(self, historico_produtos=None):
+        """Alertas de itens atípicos do mês (ver anomalias.detectar_anomalias_vendas), por versão do histórico de produtos"""
+        versao = None
+        if historico_produtos is not None:
+            versao = int(pd.util.hash_pandas_object(historico_produtos, index=False).sum())
+        return self.memo(('anomalias', versao),
+                         lambda: detectar_anomalias_vendas(self.df, historico_produtos, self.mes))
+
+    # --- DETALHAMENTO (PROJEÇÃO + PAGINAÇÃO NO SERVIDOR) ---
+
+    @cached_property
+    def detalhe(self):
+        """Visão projetada do resultado: só as colunas de COLUNAS_DETALHE que existirem"""
+        colunas = [c for c in COLUNAS_DETALHE if c in self.df.columns]
+        return self.df[colunas].reset_index(drop=True)
+
+    def total_paginas(self, tamanho_pagina):
+        return max(1, math.ceil(len(self.detalhe) / tamanho_pagina))
+
+    def _ordem(self, coluna, ascendente):
+        """Índices de ordenação por coluna (cacheados por coluna/sentido)"""
+        def calcular():
+            valores = self.detalhe[coluna].reset_index(drop=True)
+            # Texto (object/str/string) ordena sem diferenciar caixa nem acento; vazios sempre no fim
+            chave = None if pd.api.types.is_numeric_dtype(valores) else _chave_texto
+            ordenados = valores.sort_values(ascending=ascendente, kind='stable', na_position='last', key=chave)
+            return ordenados.index.to_numpy()
+        return self.memo(('ordem', coluna, ascendente), calcular)
+
+    def pagina_detalhe(self, pagina=1, tamanho_pagina=50, ordenar_por=None, ascendente=True):
+        """
+        Retorna apenas a fatia da página pedida (1-indexada), já ordenada.
+        Só essa fatia vai para o navegador.
+        """
+        pagina = min(max(1, int(pagina)), self.total_paginas(tamanho_pagina))
+        inicio = (pagina - 1) * tamanho_pagina
+        fim = inicio + tamanho_pagina
+
+        if ordenar_por and ordenar_por in self.detalhe.columns:
+            posicoes = self._ordem(ordenar_por, ascendente)[inicio:fim]
+            return self.detalhe.iloc[posicoes]
+        return self.detalhe.iloc[inicio:fim]
+
+
+def _chave_texto(valores):
+    return (valores.astype('string').str.normalize('NFKD')
+            .str.encode('ascii', 'ignore').str.decode('ascii').str.lower())
+
+
+def reduzir_serie(df, max_pontos=60):
+    """
+    Reduz uma série temporal para no máximo `max_pontos` linhas (amostragem uniforme),
+    mantendo sempre o primeiro e o último ponto.
+    """
+    if len(df) <= max_pontos:
+        return df
+    posicoes = np.unique(np.linspace(0, len(df) - 1, max_pontos).round().astype(int))
+    return df.iloc[posicoes]
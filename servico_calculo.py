@@ -0,0 +1,331 @@
+"""
+Serviço local de cálculo para uso multiusuário.
+
+O processamento do relatório (parse + cálculo) sai das sessões do Streamlit e roda aqui,
+num pool de processos já aquecidos (pandas e calculadora importados uma vez por worker).
+Resultados ficam num cache LRU compartilhado entre todos os gestores: o mesmo relatório
+com os mesmos custos, regras, pedaladas e taxas não é recalculado, e pedidos iguais que
+chegam ao mesmo tempo esperam um único cálculo.
+
+Subir o serviço:
+    python servico_calculo.py --porta 8502 --workers 4
+
+E apontar o app para ele:
+    CALCULADORA_SERVICO_URL=http://127.0.0.1:8502 streamlit run app.py
+
+Endpoints:
+    POST /processar?nome=vendas.csv&mes=Novembro/2025&pedaladas=0&taxas={json}&snapshot=<id>   corpo = bytes do relatório
+    GET  /saude                                                                                estado do pool e do cache
+
+Com `snapshot`, os custos vêm desse snapshot (snapshots_custos.py) e não dos arquivos atuais do
+--diretorio: o app e o serviço precisam enxergar o mesmo repositório de snapshots (--snapshots).
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from exportador import EXPORTADORES, exportar_bytes
+from layout_vendas import ArquivoVendasInvalido
+from snapshots_custos import DIRETORIO_SNAPSHOTS, RepositorioSnapshots
+
+PORTA_PADRAO = 8502
+TAMANHO_CACHE_PADRAO = 64
+# Relatórios maiores que isso são recusados (protege a memória do serviço)
+TAMANHO_MAXIMO_RELATORIO = 50 * 1024 * 1024
+TIMEOUT_CLIENTE = 120
+
+ARQUIVOS_CONFIGURACAO = {
+    'custos_variaveis': 'Variaveis.csv',
+    'custos_fixos': 'Fixos.csv',
+    'regras_pedalada': 'Regras_Pedalada.csv',
+}
+
+# Importados em cada worker ao subir, antes do primeiro pedido
+MODULOS_AQUECIDOS = ('calculadora_com_pedaladas', 'layout_vendas')
+
+
+class PedidoInvalido(Exception):
+    """Parâmetro ou snapshot inválido no pedido: responde 422 (o resto que falhar é 500)"""
+
+
+# Erros de quem enviou o pedido; qualquer outra exceção é bug do serviço
+ERROS_ENTRADA = (PedidoInvalido, ArquivoVendasInvalido)
+
+
+# --- Worker (roda nos processos do pool) ---
+
+def _aquecer_worker():
+    """Importa o pesado uma vez por processo, antes do primeiro pedido"""
+    # Ctrl+C fica com o processo principal, que encerra o pool em ordem
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for modulo in MODULOS_AQUECIDOS:
+        importlib.import_module(modulo)
+
+
+def _pronto():
+    return os.getpid()
+
+
+def _calcular_no_worker(conteudo, sufixo, mes_referencia, valor_pedaladas, taxas_pagamento, arquivos):
+    from calculadora_com_pedaladas import CalculadoraMargemLucroComPedalada
+
+    fd, caminho = tempfile.mkstemp(suffix=sufixo)
+    try:
+        with os.fdopen(fd, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        calc = CalculadoraMargemLucroComPedalada(
+            arquivos['custos_variaveis'], arquivos['custos_fixos'], arquivos['regras_pedalada'],
+            taxas_pagamento=taxas_pagamento
+        )
+        # O relatório de console da calculadora não tem quem leia aqui
+        with contextlib.redirect_stdout(io.StringIO()):
+            resumo, resultado = calc.processar_relatorio_mensal(caminho, mes_referencia, valor_pedaladas, salvar_resultado=False)
+        # Serializa no worker: o processo do servidor só repassa bytes
+        return serializar_resultado(resumo, resultado)
+    finally:
+        os.remove(caminho)
+
+
+# --- Serialização (mesma nos dois lados) ---
+
+def serializar_resultado(resumo, resultado):
+    # Parquet do exportador: mantém os tipos das colunas (e inf/NaN, que JSON não tem) e leva o resumo nos metadados
+    return exportar_bytes(resultado, resumo, 'parquet')
+
+
+def desserializar_resultado(corpo):
+    import pyarrow.parquet as pq
+
+    tabela = pq.read_table(io.BytesIO(corpo))
+    resumo = json.loads(tabela.schema.metadata[b'resumo'])
+    return resumo, tabela.to_pandas()
+
+
+# --- Serviço ---
+
+class ServicoCalculo:
+    """Pool de workers + cache LRU de resultados serializados + deduplicação de pedidos em andamento"""
+
+    def __init__(self, workers=None, tamanho_cache=TAMANHO_CACHE_PADRAO, diretorio='.', diretorio_snapshots=None):
+        self.arquivos = {chave: os.path.abspath(os.path.join(diretorio, nome)) for chave, nome in ARQUIVOS_CONFIGURACAO.items()}
+        self.snapshots = RepositorioSnapshots(os.path.abspath(diretorio_snapshots or os.path.join(diretorio, DIRETORIO_SNAPSHOTS)))
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_aquecer_worker)
+        self.tamanho_cache = tamanho_cache
+        self._cache = OrderedDict()
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+        self.estatisticas = {'pedidos': 0, 'acertos_cache': 0, 'calculos': 0, 'erros': 0}
+        self.aquecer()
+
+    def aquecer(self):
+        """
+        Sobe todos os workers já com os imports feitos (o pool só cria processos sob demanda).
+        Os pedidos são enviados juntos: nenhum worker está livre ainda, então cada um sobe um processo.
+
+        Returns:
+            número de processos prontos
+        """
+        return len({futuro.result() for futuro in [self.pool.submit(_pronto) for _ in range(self.workers)]})
+
+    def _versao_configuracao(self):
+        # Edições em Configurações mudam o mtime e invalidam o cache naturalmente
+        return tuple(os.path.getmtime(c) if os.path.exists(c) else None for c in self.arquivos.values())
+
+    def chave(self, conteudo, mes_referencia, valor_pedaladas, taxas_pagamento, snapshot_id=None):
+        # Snapshot é imutável: o id já identifica os custos, sem olhar mtime
+        h = hashlib.sha256(conteudo)
+        h.update(json.dumps([mes_referencia, float(valor_pedaladas), taxas_pagamento or {},
+                             snapshot_id or self._versao_configuracao()], sort_keys=True, default=str).encode('utf-8'))
+        return h.hexdigest()
+
+    def processar(self, conteudo, nome_arquivo, mes_referencia, valor_pedaladas=0, taxas_pagamento=None, snapshot_id=None):
+        """
+        Args:
+            snapshot_id: calcula com os custos desse snapshot (PedidoInvalido se o serviço não o conhecer)
+
+        Returns:
+            bytes Parquet com produtos e resumo (já serializado, para servir direto do cache)
+        """
+        try:
+            arquivos = self.snapshots.caminhos(snapshot_id) if snapshot_id else self.arquivos
+        except ValueError as e:
+            raise PedidoInvalido(str(e)) from None
+        chave = self.chave(conteudo, mes_referencia, valor_pedaladas, taxas_pagamento, snapshot_id)
+        with self._lock:
+            self.estatisticas['pedidos'] += 1
+            if chave in self._cache:
+                self._cache.move_to_end(chave)
+                self.estatisticas['acertos_cache'] += 1
+                return self._cache[chave]
+            futuro = self._em_andamento.get(chave)
+            dono = futuro is None
+            if dono:
+                sufixo = os.path.splitext(nome_arquivo or '')[1].lower() or '.csv'
+                futuro = self.pool.submit(_calcular_no_worker, conteudo, sufixo, mes_referencia,
+                                          valor_pedaladas, taxas_pagamento, arquivos)
+                self._em_andamento[chave] = futuro
+                self.estatisticas['calculos'] += 1
+            else:
+                self.estatisticas['acertos_cache'] += 1
+
+        try:
+            corpo = futuro.result()
+        except Exception:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+                self.estatisticas['erros'] += 1
+            raise
+
+        if dono:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+                self._cache[chave] = corpo
+                while len(self._cache) > self.tamanho_cache:
+                    self._cache.popitem(last=False)
+        return corpo
+
+    def saude(self):
+        with self._lock:
+            return {**self.estatisticas, 'workers': self.workers, 'itens_cache': len(self._cache),
+                    'em_andamento': len(self._em_andamento)}
+
+    def encerrar(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    servico = None
+    protocol_version = 'HTTP/1.1'
+
+    def _responder(self, status, corpo, tipo='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _erro(self, status, mensagem):
+        self._responder(status, json.dumps({'erro': mensagem}, ensure_ascii=False).encode('utf-8'))
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path == '/saude':
+            self._responder(200, json.dumps(self.servico.saude()).encode('utf-8'))
+        else:
+            self._erro(404, 'Rota não encontrada')
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != '/processar':
+            return self._erro(404, 'Rota não encontrada')
+
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        if tamanho <= 0:
+            return self._erro(400, 'Relatório de vendas vazio')
+        if tamanho > TAMANHO_MAXIMO_RELATORIO:
+            return self._erro(413, f'Relatório maior que {TAMANHO_MAXIMO_RELATORIO // (1024 * 1024)} MB')
+        conteudo = self.rfile.read(tamanho)
+
+        parametros = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        try:
+            valor_pedaladas = float(parametros.get('pedaladas', 0))
+            taxas = json.loads(parametros['taxas']) if parametros.get('taxas') else None
+        except ValueError as e:
+            return self._erro(400, f'Parâmetro inválido: {e}')
+
+        try:
+            corpo = self.servico.processar(conteudo, parametros.get('nome', 'vendas.csv'),
+                                           parametros.get('mes'), valor_pedaladas, taxas, parametros.get('snapshot'))
+        except ERROS_ENTRADA as e:
+            # Layout não reconhecido, arquivo ilegível, snapshot desconhecido: erro de quem enviou
+            return self._erro(422, str(e))
+        except Exception as e:
+            return self._erro(500, f'{type(e).__name__}: {e}')
+        self._responder(200, corpo, EXPORTADORES['parquet'].mime)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def criar_servidor(servico, host='127.0.0.1', porta=PORTA_PADRAO):
+    manipulador = type('Manipulador', (_Manipulador,), {'servico': servico})
+    return ThreadingHTTPServer((host, porta), manipulador)
+
+
+# --- Cliente (usado pelo app.py em modo multiusuário) ---
+
+def processar_remoto(url_base, conteudo, nome_arquivo, mes_referencia, valor_pedaladas=0, taxas_pagamento=None,
+                     snapshot_id=None):
+    """
+    Envia o relatório ao serviço e devolve (resumo, df_resultado), como processar_relatorio_mensal.
+    Com snapshot_id, o serviço calcula com os custos desse snapshot.
+    Erros do arquivo ou snapshot desconhecido (422) viram ValueError; o resto, RuntimeError.
+    """
+    parametros = {'nome': nome_arquivo, 'mes': mes_referencia, 'pedaladas': valor_pedaladas}
+    if taxas_pagamento:
+        parametros['taxas'] = json.dumps(taxas_pagamento)
+    if snapshot_id:
+        parametros['snapshot'] = snapshot_id
+    url = f"{url_base.rstrip('/')}/processar?{urllib.parse.urlencode(parametros)}"
+    pedido = urllib.request.Request(url, data=conteudo, method='POST',
+                                    headers={'Content-Type': 'application/octet-stream'})
+    try:
+        with urllib.request.urlopen(pedido, timeout=TIMEOUT_CLIENTE) as resposta:
+            return desserializar_resultado(resposta.read())
+    except urllib.error.HTTPError as e:
+        try:
+            mensagem = json.loads(e.read()).get('erro', str(e))
+        except ValueError:
+            mensagem = str(e)
+        if e.code == 422:
+            raise ValueError(mensagem) from None
+        raise RuntimeError(f"Serviço de cálculo respondeu {e.code}: {mensagem}") from None
+
+
+def _interromper(sinal, quadro):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço local de cálculo da margem de lucro")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=PORTA_PADRAO)
+    parser.add_argument('--workers', type=int, default=None, help="processos de cálculo (padrão: nº de CPUs)")
+    parser.add_argument('--cache', type=int, default=TAMANHO_CACHE_PADRAO, help="resultados mantidos em memória")
+    parser.add_argument('--diretorio', default='.', help="onde estão Variaveis.csv, Fixos.csv e Regras_Pedalada.csv")
+    parser.add_argument('--snapshots', default=None, help=f"repositório de snapshots de custos (padrão: <diretorio>/{DIRETORIO_SNAPSHOTS})")
+    args = parser.parse_args()
+
+    servico = ServicoCalculo(args.workers, args.cache, args.diretorio, args.snapshots)
+    servidor = criar_servidor(servico, args.host, args.porta)
+    print(f"🚀 Serviço de cálculo em http://{args.host}:{args.porta} ({servico.workers} workers, cache de {args.cache})")
+    inicio = time.time()
+    # kill/systemd (SIGTERM) encerra do mesmo jeito que Ctrl+C
+    signal.signal(signal.SIGTERM, _interromper)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servico.encerrar()
+        print(f"👋 Serviço encerrado após {time.time() - inicio:.0f}s: {servico.saude()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Snapshots versionados das tabelas de custo (Variaveis.csv, Fixos.csv e Regras_Pedalada.csv).
+
+Armazenamento endereçado por conteúdo:
+    snapshots_custos/objetos/<hash>.<ext>   conteúdo de cada arquivo, gravado uma única vez (deduplicado)
+    snapshots_custos/snapshots/<id>.json    manifesto {tabela: objeto}; o id é o hash do próprio manifesto
+    snapshots_custos/indice.csv             quando cada snapshot foi criado e por quê
+
+Os relatórios de vendas também viram objetos. Cada linha do histórico guarda o snapshot, o
+relatório, as pedaladas informadas e as taxas usadas, então um mês antigo é recalculado com
+os custos da sua época, e o job de recálculo pula os meses cuja entrada não mudou.
+
+    python snapshots_custos.py criar "Reajuste do aluguel"
+    python snapshots_custos.py listar
+    python snapshots_custos.py recalcular --snapshot <id> --meses Janeiro/2025 Fevereiro/2025
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from anomalias import participacao_credito
+from calculadora_com_pedaladas import CalculadoraMargemLucroComPedalada
+from exportador import exportar_arquivo, modo_arquivo
+
+DIRETORIO_SNAPSHOTS = 'snapshots_custos'
+ARQUIVO_HISTORICO = 'historico_financeiro.csv'
+
+# Tabela -> arquivo de trabalho editado em Configurações
+TABELAS_CUSTO = {
+    'custos_variaveis': 'Variaveis.csv',
+    'custos_fixos': 'Fixos.csv',
+    'regras_pedalada': 'Regras_Pedalada.csv',
+}
+
+# Tamanho dos ids exibidos (hex do SHA-256)
+TAMANHO_ID = 16
+
+# Ids que chegam de fora (histórico, parâmetro do serviço) viram caminhos: só hex, sem '../'
+PADRAO_ID_SNAPSHOT = re.compile(rf'[0-9a-f]{{{TAMANHO_ID}}}')
+PADRAO_OBJETO = re.compile(r'[0-9a-f]{64}\.[a-z0-9]{1,8}')
+
+# Colunas do histórico que identificam a entrada do cálculo de cada mês.
+# Snapshot_Custos é sempre o da época; Snapshot_Recalculo, o aplicado por um recálculo com --snapshot
+COLUNAS_RASTREIO = ['Snapshot_Custos', 'Snapshot_Recalculo', 'Objeto_Vendas', 'Pedaladas_Informadas', 'Taxas_Pagamento',
+                    'Chave_Entrada']
+
+# Ids e JSON: lidos como texto (um id só com dígitos, ou '1e5...', viraria número)
+COLUNAS_TEXTO_HISTORICO = ['Snapshot_Custos', 'Snapshot_Recalculo', 'Objeto_Vendas', 'Taxas_Pagamento', 'Chave_Entrada']
+
+
+def _hash(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def _gravar_atomico(caminho, conteudo):
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.chmod(temporario, modo_arquivo(caminho))
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+class RepositorioSnapshots:
+    """Objetos e manifestos imutáveis em disco; gravar o mesmo conteúdo de novo não ocupa espaço"""
+
+    def __init__(self, diretorio=DIRETORIO_SNAPSHOTS):
+        self.diretorio = diretorio
+        self.dir_objetos = os.path.join(diretorio, 'objetos')
+        self.dir_snapshots = os.path.join(diretorio, 'snapshots')
+        self.arquivo_indice = os.path.join(diretorio, 'indice.csv')
+        os.makedirs(self.dir_objetos, exist_ok=True)
+        os.makedirs(self.dir_snapshots, exist_ok=True)
+
+    # --- Objetos ---
+
+    def guardar_objeto(self, conteudo, extensao='.csv'):
+        """Grava o conteúdo (se ainda não existir) e devolve o id do objeto: '<sha256><extensão>'"""
+        objeto = f"{_hash(conteudo)}{extensao.lower()}"
+        caminho = self.caminho_objeto(objeto)
+        if not os.path.exists(caminho):
+            _gravar_atomico(caminho, conteudo)
+        return objeto
+
+    def caminho_objeto(self, objeto):
+        if not PADRAO_OBJETO.fullmatch(str(objeto)):
+            raise ValueError(f"Id de objeto inválido: {objeto!r}")
+        return os.path.join(self.dir_objetos, objeto)
+
+    # --- Snapshots ---
+
+    def criar_snapshot(self, arquivos=None, descricao=''):
+        """
+        Congela as tabelas de custo atuais. Se o conteúdo for igual ao de um snapshot
+        existente, devolve o mesmo id sem gravar nada.
+
+        Args:
+            arquivos: {tabela: caminho}; padrão TABELAS_CUSTO no diretório atual
+        """
+        arquivos = arquivos or TABELAS_CUSTO
+        manifesto = {}
+        for tabela, caminho in arquivos.items():
+            if caminho and os.path.exists(caminho):
+                with open(caminho, 'rb') as arquivo:
+                    manifesto[tabela] = self.guardar_objeto(arquivo.read(), os.path.splitext(caminho)[1] or '.csv')
+
+        conteudo = json.dumps(manifesto, sort_keys=True, indent=2).encode('utf-8')
+        snapshot_id = _hash(conteudo)[:TAMANHO_ID]
+        caminho = os.path.join(self.dir_snapshots, f"{snapshot_id}.json")
+        if not os.path.exists(caminho):
+            _gravar_atomico(caminho, conteudo)
+            registro = pd.DataFrame([{'Snapshot': snapshot_id, 'Criado_Em': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                      'Descricao': descricao}])
+            registro.to_csv(self.arquivo_indice, mode='a', header=not os.path.exists(self.arquivo_indice), index=False)
+        return snapshot_id
+
+    def manifesto(self, snapshot_id):
+        if not PADRAO_ID_SNAPSHOT.fullmatch(str(snapshot_id)):
+            raise ValueError(f"Id de snapshot inválido: {snapshot_id!r} (esperado {TAMANHO_ID} caracteres hexadecimais)")
+        caminho = os.path.join(self.dir_snapshots, f"{snapshot_id}.json")
+        if not os.path.exists(caminho):
+            raise ValueError(f"Snapshot de custos não encontrado: {snapshot_id}")
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+
+    def caminhos(self, snapshot_id):
+        """{tabela: caminho do objeto} (tabela ausente no snapshot -> None, a calculadora usa o padrão)"""
+        manifesto = self.manifesto(snapshot_id)
+        return {tabela: (self.caminho_objeto(manifesto[tabela]) if tabela in manifesto else None) for tabela in TABELAS_CUSTO}
+
+    def calculadora(self, snapshot_id, **kwargs):
+        """Calculadora lendo direto dos objetos do snapshot (nada é copiado)"""
+        caminhos = self.caminhos(snapshot_id)
+        return CalculadoraMargemLucroComPedalada(caminhos['custos_variaveis'], caminhos['custos_fixos'],
+                                                 caminhos['regras_pedalada'], **kwargs)
+
+    def listar(self):
+        if not os.path.exists(self.arquivo_indice):
+            return pd.DataFrame(columns=['Snapshot', 'Criado_Em', 'Descricao'])
+        return pd.read_csv(self.arquivo_indice, dtype=str, keep_default_na=False)
+
+
+# --- Histórico ---
+
+def chave_entrada(objeto_vendas, snapshot_id, pedaladas_informadas=0, taxas_pagamento=None):
+    """Identifica a entrada completa do cálculo de um mês (igual -> resultado igual)"""
+    entrada = json.dumps([objeto_vendas, snapshot_id, round(float(pedaladas_informadas or 0), 2), taxas_pagamento or {}],
+                         sort_keys=True)
+    return _hash(entrada.encode('utf-8'))[:TAMANHO_ID]
+
+
+def registro_historico(resumo, mes_referencia, snapshot_id=None, objeto_vendas=None, pedaladas_informadas=0,
+                       taxas_pagamento=None):
+    """Linha do historico_financeiro.csv a partir do resumo do mês"""
+    return {
+        "Mes_Referencia": mes_referencia,
+        "Receita_Real": resumo['receita_bruta_real'],
+        "Lucro_Liquido": resumo['lucro_liquido_estimado'],
+        "Margem_Percentual": resumo['margem_liquida_percentual'],
+        "Custos_Fixos": resumo['custos_fixos_total'],
+        "Margem_Bruta": resumo['margem_bruta'],
+        "Ticket_Medio": resumo.get('ticket_medio_real', 0),
+        "Participacao_Credito": participacao_credito(resumo),
+        "Snapshot_Custos": snapshot_id,
+        "Snapshot_Recalculo": None,
+        "Objeto_Vendas": objeto_vendas,
+        "Pedaladas_Informadas": pedaladas_informadas,
+        "Taxas_Pagamento": json.dumps(taxas_pagamento, sort_keys=True, ensure_ascii=False) if taxas_pagamento else None,
+        "Chave_Entrada": chave_entrada(objeto_vendas, snapshot_id, pedaladas_informadas, taxas_pagamento)
+                         if snapshot_id and objeto_vendas else None,
+    }
+
+
+def ler_historico(arquivo=ARQUIVO_HISTORICO):
+    """historico_financeiro.csv com as colunas de rastreio como texto"""
+    return pd.read_csv(arquivo, dtype={coluna: str for coluna in COLUNAS_TEXTO_HISTORICO})
+
+
+def salvar_no_historico(registros, arquivo=ARQUIVO_HISTORICO):
+    """Insere/substitui os meses dos `registros` no histórico (escrita atômica)"""
+    df_novo = pd.DataFrame(registros)
+    if os.path.exists(arquivo):
+        df_antigo = ler_historico(arquivo)
+        # Remove duplicatas do mesmo mês
+        df_antigo = df_antigo[~df_antigo['Mes_Referencia'].isin(df_novo['Mes_Referencia'])]
+        df_novo = pd.concat([df_antigo, df_novo], ignore_index=True)
+    exportar_arquivo(df_novo, {}, arquivo, formato='csv')
+    return df_novo
+
+
+def recalcular_historico(repositorio, snapshot_id=None, meses=None, arquivo=ARQUIVO_HISTORICO, forcar=False):
+    """
+    Recalcula meses do histórico a partir do relatório de vendas guardado.
+
+    Args:
+        snapshot_id: custos a aplicar; None = o snapshot com que cada mês foi fechado. O snapshot
+            da época continua em Snapshot_Custos; o aplicado vai para Snapshot_Recalculo
+        meses: lista de Mes_Referencia; None = todos
+        forcar: recalcula mesmo se a entrada (vendas + snapshot + pedaladas + taxas) não mudou
+
+    Returns:
+        dict com as listas de meses 'recalculados', 'pulados' (entrada igual) e 'sem_vendas'
+        (linhas antigas, sem relatório guardado), e 'erros' ({mês: mensagem}). Um mês com erro
+        não interrompe os demais, e os recalculados são salvos mesmo assim.
+    """
+    relatorio = {'recalculados': [], 'pulados': [], 'sem_vendas': [], 'erros': {}}
+    if not os.path.exists(arquivo):
+        return relatorio
+
+    historico = ler_historico(arquivo)
+    for coluna in COLUNAS_RASTREIO:
+        if coluna not in historico.columns:
+            historico[coluna] = None
+    if meses is not None:
+        historico = historico[historico['Mes_Referencia'].isin(meses)]
+
+    novos = []
+    for linha in historico.to_dict('records'):
+        mes = linha['Mes_Referencia']
+        objeto_vendas = linha['Objeto_Vendas'] if pd.notna(linha['Objeto_Vendas']) else None
+        original = linha['Snapshot_Custos'] if pd.notna(linha['Snapshot_Custos']) else None
+        alvo = snapshot_id or original
+        if objeto_vendas is None or alvo is None:
+            relatorio['sem_vendas'].append(mes)
+            continue
+
+        pedaladas = float(linha['Pedaladas_Informadas']) if pd.notna(linha['Pedaladas_Informadas']) else 0.0
+        taxas = json.loads(linha['Taxas_Pagamento']) if pd.notna(linha['Taxas_Pagamento']) else None
+        if not forcar and chave_entrada(objeto_vendas, alvo, pedaladas, taxas) == linha['Chave_Entrada']:
+            relatorio['pulados'].append(mes)
+            continue
+
+        try:
+            calc = repositorio.calculadora(alvo, taxas_pagamento=taxas)
+            with contextlib.redirect_stdout(io.StringIO()):
+                resumo, _ = calc.processar_relatorio_mensal(repositorio.caminho_objeto(objeto_vendas), mes, pedaladas,
+                                                            salvar_resultado=False)
+        except (ValueError, KeyError, OSError) as e:
+            # Snapshot/objeto sumido ou layout não reconhecido: registra e segue para o próximo mês
+            relatorio['erros'][mes] = str(e)
+            continue
+        registro = registro_historico(resumo, mes, alvo, objeto_vendas, pedaladas, taxas)
+        registro['Snapshot_Custos'] = original
+        registro['Snapshot_Recalculo'] = alvo if alvo != original else None
+        novos.append(registro)
+        relatorio['recalculados'].append(mes)
+
+    if novos:
+        salvar_no_historico(novos, arquivo)
+    return relatorio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshots das tabelas de custo e recálculo do histórico")
+    parser.add_argument('--diretorio', default=DIRETORIO_SNAPSHOTS)
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    criar = comandos.add_parser('criar', help="congela Variaveis.csv, Fixos.csv e Regras_Pedalada.csv atuais")
+    criar.add_argument('descricao', nargs='?', default='')
+
+    comandos.add_parser('listar', help="snapshots existentes")
+
+    recalcular = comandos.add_parser('recalcular', help="recalcula meses do histórico")
+    recalcular.add_argument('--snapshot', help="custos a aplicar (padrão: os da época de cada mês)")
+    recalcular.add_argument('--meses', nargs='+', help="ex: Janeiro/2025 Fevereiro/2025 (padrão: todos)")
+    recalcular.add_argument('--historico', default=ARQUIVO_HISTORICO)
+    recalcular.add_argument('--forcar', action='store_true', help="recalcula mesmo sem mudança na entrada")
+
+    args = parser.parse_args(argv)
+    repositorio = RepositorioSnapshots(args.diretorio)
+
+    if args.comando == 'criar':
+        print(f"📸 Snapshot de custos: {repositorio.criar_snapshot(descricao=args.descricao)}")
+    elif args.comando == 'listar':
+        print(repositorio.listar().to_string(index=False))
+    else:
+        relatorio = recalcular_historico(repositorio, args.snapshot, args.meses, args.historico, args.forcar)
+        print(f"🔁 Recalculados: {len(relatorio['recalculados'])} {relatorio['recalculados']}")
+        print(f"⏭️  Sem mudança (pulados): {len(relatorio['pulados'])}")
+        if relatorio['sem_vendas']:
+            print(f"⚠️  Sem relatório de vendas guardado: {relatorio['sem_vendas']}")
+        for mes, mensagem in relatorio['erros'].items():
+            print(f"❌ {mes}: {mensagem}")
+        return 1 if relatorio['erros'] else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())